@@ -7,10 +7,15 @@
 # -----------------------------------------------------------------------------------
 # -----------------------------------------------------------------------------------
 
+import base64
+import json
+import shutil
+import time
 import requests
 import urllib3
 import os
 from datetime import datetime
+from html.parser import HTMLParser
 from typing import List
 
 
@@ -18,6 +23,31 @@ urllib3.disable_warnings(
     urllib3.exceptions.InsecureRequestWarning)  # Supresses the "InsecureRequestWarning: Unverified HTTPS request is being made" you get when downloading from a CPD cluster.
 
 
+class _ProjectIdParser(HTMLParser):
+    """Single forward pass over a CPD page source to find the project ID of a project name.
+    Keeps the last `data-id` attribute seen and returns it when it finds an `<a>` element with the project name as text.
+    """
+    def __init__(self, project_name: str):
+        super().__init__()
+        self.project_name = project_name
+        self.project_id = None
+        self._last_data_id = None
+        self._in_anchor = False
+
+    def handle_starttag(self, tag, attrs):
+        for name, value in attrs:
+            if name == 'data-id':
+                self._last_data_id = value
+        self._in_anchor = (tag == 'a')
+
+    def handle_endtag(self, tag):
+        self._in_anchor = False
+
+    def handle_data(self, data):
+        if self.project_id is None and self._in_anchor and data == self.project_name:
+            self.project_id = self._last_data_id
+
+
 class DOModelExporter(object):
     """DEPRECATED. These APis are no longer available from CPDv3.5
     Exports a DO model from CPD2.5 using curl/web-requests.
@@ -39,6 +69,9 @@ class DOModelExporter(object):
             me = DOModelExporter(do_model_names = ['Model1', 'Model2'])
             me.export_do_models()
 
+        The exporter keeps the connections to the cluster open. Call `me.close()` when done,
+        or use the exporter as a context manager: `with DOModelExporter(...) as me:`.
+
     2. Export from another project in same cluster:
         Need to specify the `project_id`. See below for how to get the project_id.
         Assumes current user is a collaborator on the other project (if not use the next use-case)::
@@ -124,14 +157,38 @@ class DOModelExporter(object):
             export_directory (str, Optional): name of directory to store file. If '/project_data/data_asset/', it will also add as WS Data Asset
         """
         self.do_model_names = do_model_names
-        self.cpd_cluster_host = kwargs.get('cpd_cluster_host', os.environ['RUNTIME_ENV_APSX_URL'])
-        self.project_id = kwargs.get('project_id', os.environ['PROJECT_ID'])
-        self.access_token = kwargs.get('access_token', os.environ['USER_ACCESS_TOKEN'])
+        self.cpd_cluster_host = DOModelExporter._resolve(kwargs, 'cpd_cluster_host', 'RUNTIME_ENV_APSX_URL')
+        self.project_id = DOModelExporter._resolve(kwargs, 'project_id', 'PROJECT_ID')
+        self.access_token = DOModelExporter._resolve(kwargs, 'access_token', 'USER_ACCESS_TOKEN')
         self.user_name = kwargs.get('user_name', None)
         self.password = kwargs.get('password', None)
+        self._token_exp = None  # Expiry of an access_token retrieved with the user_name and password
         # self.export_file_name = kwargs.get('export_file_name',
         #                                    f"{do_model_name}_export_{datetime.now().strftime('%Y%m%d_%H%M')}.zip")
         self.export_directory = kwargs.get('export_directory', '/project_data/data_asset/')
+        # Re-use one keep-alive connection pool to the cluster, so the host is resolved and connected only once
+        self.session = requests.Session()
+        self.session.verify = False
+
+    def close(self) -> None:
+        """Closes the session, i.e. the connections to the cluster."""
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @staticmethod
+    def _resolve(kwargs: dict, key: str, env_var: str):
+        """Returns the value of the key in the kwargs. Only if the key is absent, falls back to the environment variable.
+        An explicit None value is kept (e.g. `access_token=None` to retrieve the token using the user-name and password).
+        Returns None if the key is absent and the environment variable is not set.
+        """
+        if key in kwargs:
+            return kwargs[key]
+        return os.environ.get(env_var)
 
     def get_access_token_curl(self) -> str:
         """Return the curl command to retreive the accessToken.
@@ -167,15 +224,12 @@ class DOModelExporter(object):
             project_id (str)
 
         """
-        project_name_match = f">{project_name}</a>"
-        project_name_start = page_source.find(project_name_match)
-        if project_name_start == -1:
-            print(f"Could not find project using '{project_name_match}'")
-            project_id = None
-        else:
-            start_project_id = page_source.rfind('data-id=', 0, project_name_start) + 9
-            end_project_id = page_source.find('"', start_project_id)
-            project_id = page_source[start_project_id:end_project_id]
+        parser = _ProjectIdParser(project_name)
+        parser.feed(page_source)
+        parser.close()
+        project_id = parser.project_id
+        if project_id is None:
+            print(f"Could not find project using '>{project_name}</a>'")
         return project_id
 
     def get_access_token_web(self) -> requests.Response:
@@ -192,10 +246,11 @@ class DOModelExporter(object):
             'Accept-Encoding': 'gzip, deflate',
         }
         url = f'{self.cpd_cluster_host}/v1/preauth/validateAuth'
-        response = requests.get(url, headers=headers, verify=False, auth=(self.user_name, self.password))
+        response = self.session.get(url, headers=headers, auth=(self.user_name, self.password))
         if response.status_code == 200:
             print("Success retrieving accessToken.")
             self.access_token = response.json()['accessToken']
+            self._token_exp = DOModelExporter._get_token_expiry(self.access_token)
         elif response.status_code == 401:
             print("Error retrieving accessToken: {}".format(response.json()['message']))
             self.access_token = None
@@ -204,10 +259,32 @@ class DOModelExporter(object):
             self.access_token = None
         return response
 
+    @staticmethod
+    def _get_token_expiry(access_token: str) -> float:
+        """Returns the expiry time (seconds since epoch) of a JWT access token.
+        Falls back to one hour from now if the token is not a JWT or has no `exp` claim.
+        """
+        try:
+            payload = access_token.split('.')[1]
+            claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+            return float(claims['exp'])
+        except (IndexError, KeyError, TypeError, ValueError):
+            return time.time() + 3600
+
+    def _refresh_access_token_if_expiring(self, margin_seconds: int = 60) -> None:
+        """Retrieves a new access token if the current one, retrieved with the user-name and password, is about to expire.
+        Avoids a series of 401 errors when exporting many DO models.
+        """
+        if self._token_exp is not None and time.time() > self._token_exp - margin_seconds:
+            print("AccessToken is about to expire. Retrieving a new accessToken.")
+            self.get_access_token_web()
+
     def get_do_model_export_web(self, do_model_name: str) -> requests.Response:
         """Runs web-request to get DO model export.
         Based on the cluster_name, access_token, do_model_name.
         Stores result as a Data Asset
+        Returns the (closed) response. Note that on success, the zip is streamed to the file,
+        so the body (e.g. `response.content`) is no longer available. On an error, the body is available as before.
         """
         headers = {
             'Accept': 'application/zip',
@@ -219,20 +296,22 @@ class DOModelExporter(object):
         )
 
         url = f"{self.cpd_cluster_host}/v2/decisions/{do_model_name}/archive"
-        response = requests.get(url, headers=headers, params=params, verify=False)
-
-        if response.status_code == 200:
-            # Success
-            print("Success downloading DO Model. Writing to file.")
-            file_path = self.write_do_model_to_file(do_model_name, response)
-            print(f"Exported DO model in {file_path}")
-
-        elif response.status_code == 404:
-            print("Error downloading DO Model: {}".format(response.json()['errors'][0]['message']))
-        elif response.status_code == 400:
-            print("Error downloading DO Model. Status code = {}. Check project_id.".format(response.status_code))
-        else:
-            print("Error downloading. Status code = {}".format(response.status_code))
+        # Streamed response: the `with` releases the connection back to the pool, also if the request failed
+        with self.session.get(url, headers=headers, params=params, stream=True) as response:
+            if response.status_code != 200:
+                response.content  # Read the (small) error body, so it is still available after the response is closed
+            if response.status_code == 200:
+                # Success
+                print("Success downloading DO Model. Writing to file.")
+                file_path = self.write_do_model_to_file(do_model_name, response)
+                print(f"Exported DO model in {file_path}")
+
+            elif response.status_code == 404:
+                print("Error downloading DO Model: {}".format(response.json()['errors'][0]['message']))
+            elif response.status_code == 400:
+                print("Error downloading DO Model. Status code = {}. Check project_id.".format(response.status_code))
+            else:
+                print("Error downloading. Status code = {}".format(response.status_code))
         return response
 
     @staticmethod
@@ -240,15 +319,17 @@ class DOModelExporter(object):
         return f"{do_model_name}_export_{datetime.now().strftime('%Y%m%d_%H%M')}.zip"
 
     def write_do_model_to_file(self, do_model_name: str, response: requests.Response) -> str:
-        import os
         export_file_name = DOModelExporter._get_export_file_name(do_model_name)
         file_path = os.path.join(self.export_directory, export_file_name)
-        with open(file_path, 'wb') as f:
-            f.write(response.content)
-        # If CPD2.5 then also add as asset:
-        if self.export_directory == '/project_data/data_asset/':
-            print("Adding export file to Data Assets of this project.")
-            with open(file_path, 'rb') as f:
+        with open(file_path, 'w+b') as f:
+            # Stream the (raw) zip straight to file in 1 MiB blocks
+            response.raw.decode_content = True
+            shutil.copyfileobj(response.raw, f, length=1024 * 1024)
+            # If CPD2.5 then also add as asset:
+            if self.export_directory == '/project_data/data_asset/':
+                print("Adding export file to Data Assets of this project.")
+                # Re-use the open file handle instead of re-opening the file we just wrote
+                f.seek(0)
                 from project_lib import Project
                 project = Project.access()
                 project.save_data(file_name=export_file_name, data=f, overwrite=True)
@@ -262,6 +343,10 @@ class DOModelExporter(object):
         # Regular export DO model
         if self.access_token is not None:
             for do_model_name in self.do_model_names:
+                self._refresh_access_token_if_expiring()
+                if self.access_token is None:
+                    print("AccessToken is None, not possible to export remaining DO models.")
+                    break
                 self.get_do_model_export_web(do_model_name)
         else:
             print("AccessToken is None, not possible to export DO models.")
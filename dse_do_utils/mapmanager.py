@@ -6,11 +6,57 @@
 # MapManager
 # -----------------------------------------------------------------------------------
 # -----------------------------------------------------------------------------------
+import html
+import math
 from typing import List, Tuple
 
-from folium import folium, Marker
+import numpy as np
+import folium
+from folium import Marker
 from folium.plugins import BeautifyIcon
 
+_px = None  # plotly.express, imported on first use
+
+
+def _get_plotly_express():
+    """Lazy import of plotly.express. Plotly is a heavy import and only needed for the default color palettes."""
+    global _px
+    if _px is None:
+        import plotly.express as px
+        _px = px
+    return _px
+
+
+_bearings_nb = None  # numba kernel for `MapManager.get_bearings`. Defined on first use, see `_get_bearings_nb()`
+
+
+def _get_bearings_nb():
+    """Returns the numba kernel for `MapManager.get_bearings`, or False if numba is not installed.
+    numba (optional) is a heavy import, so it is only imported and the kernel defined on first use."""
+    global _bearings_nb
+    if _bearings_nb is None:
+        try:
+            import numba
+        except ImportError:
+            _bearings_nb = False
+            return _bearings_nb
+
+        @numba.njit(cache=True, parallel=True)
+        def bearings_nb(lat1, lon1, lat2, lon2, out):
+            """Compass bearings for 1-D float64 arrays. Fills `out`."""
+            deg_to_rad = math.pi / 180.0
+            for i in numba.prange(out.shape[0]):
+                long_diff = (lon2[i] - lon1[i]) * deg_to_rad
+                lat1_r = lat1[i] * deg_to_rad
+                lat2_r = lat2[i] * deg_to_rad
+                x = math.sin(long_diff) * math.cos(lat2_r)
+                y = math.cos(lat1_r) * math.sin(lat2_r) - math.sin(lat1_r) * math.cos(lat2_r) * math.cos(long_diff)
+                out[i] = (math.atan2(x, y) / deg_to_rad + 360.0) % 360.0
+            return out
+
+        _bearings_nb = bearings_nb
+    return _bearings_nb
+
 
 class MapManager(object):
     """Base class for building Folium map visualization.
@@ -36,10 +82,10 @@ class MapManager(object):
 
 
     kansas_city_coord = [39.085594, -94.585241]  # Kansas City, roughly the geographic center of the USA
+    numba_min_bearings = 10000  # Minimum number of points for `get_bearings` to use the numba kernel (if installed)
 
     def __init__(self, data_manager=None, location=None, zoom_start=1, width='100%', height='100%',
                  layer_control_position='topleft'):
-        import folium  # Import here so that you only do the import if you are actually using this class
         self.dm = data_manager
         self.location = location
         self.zoom_start = zoom_start
@@ -48,13 +94,11 @@ class MapManager(object):
         self.layer_control_position = layer_control_position
 
     def create_blank_map(self):
-        import folium
         m = folium.Map(location=self.location, zoom_start=self.zoom_start, tiles='cartodbpositron', width=self.width,
                        height=self.height)
         return m
 
     def add_layer_control(self, m):
-        import folium
         # Typical value = `topleft`
         if self.layer_control_position is not None:
             folium.LayerControl(position=self.layer_control_position).add_to(m)
@@ -86,26 +130,72 @@ class MapManager(object):
         Return
         compass bearing of type float
 
+        Notes
+        See `get_bearing_lat_lon`
+        """
+        return MapManager.get_bearing_lat_lon(p1.lat, p1.lon, p2.lat, p2.lon)
+
+    @staticmethod
+    def get_bearing_lat_lon(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+        """
+        Returns compass bearing from (lat1, lon1) to (lat2, lon2)
+
+        Return
+        compass bearing of type float
+
         Notes
         Based on https://gist.github.com/jeromer/2005586
+        Uses the `math` module: for scalars much faster than the numpy ufuncs. See `get_bearings` for arrays.
         """
-        import numpy as np
-        long_diff = np.radians(p2.lon - p1.lon)
+        long_diff = math.radians(lon2 - lon1)
+
+        lat1 = math.radians(lat1)
+        lat2 = math.radians(lat2)
 
-        lat1 = np.radians(p1.lat)
-        lat2 = np.radians(p2.lat)
+        x = math.sin(long_diff) * math.cos(lat2)
+        y = (math.cos(lat1) * math.sin(lat2)
+             - (math.sin(lat1) * math.cos(lat2)
+                * math.cos(long_diff)))
+
+        # adjusting for compass bearing
+        return math.degrees(math.atan2(x, y)) % 360.0
+
+    @staticmethod
+    def get_bearings(lat1, lon1, lat2, lon2):
+        """
+        Returns compass bearings from points 1 to points 2.
+        Vectorized version of `get_bearing`: computes all bearings with a single set of numpy calls.
+
+        Parameters
+        lat1, lon1 : array-like with lat and lon of the from-points
+        lat2, lon2 : array-like with lat and lon of the to-points
+
+        Return
+        numpy array of compass bearings in [0, 360)
+
+        Notes
+        If numba is installed, large arrays (at least `MapManager.numba_min_bearings` points) are computed
+        with a JIT-compiled parallel kernel.
+        """
+        if np.size(lat1) >= MapManager.numba_min_bearings and _get_bearings_nb():
+            lat1, lon1, lat2, lon2 = np.broadcast_arrays(*(np.asarray(a, dtype=np.float64)
+                                                           for a in (lat1, lon1, lat2, lon2)))
+            out = np.empty(lat1.size, dtype=np.float64)
+            _bearings_nb(lat1.ravel(), lon1.ravel(), lat2.ravel(), lon2.ravel(), out)
+            return out.reshape(lat1.shape)
+
+        long_diff = np.radians(np.subtract(lon2, lon1))
+
+        lat1 = np.radians(lat1)
+        lat2 = np.radians(lat2)
 
         x = np.sin(long_diff) * np.cos(lat2)
         y = (np.cos(lat1) * np.sin(lat2)
              - (np.sin(lat1) * np.cos(lat2)
                 * np.cos(long_diff)))
 
-        bearing = np.degrees(np.arctan2(x, y))
-
         # adjusting for compass bearing
-        if bearing < 0:
-            return bearing + 360
-        return bearing
+        return np.mod(np.degrees(np.arctan2(x, y)), 360.0)
 
     @staticmethod
     def get_arrows(locations, color='blue', size=6, n_arrows=3, add_to=None):
@@ -129,33 +219,33 @@ class MapManager(object):
         """
         # TODO: generalize so that locations can be any length >=2, i.e. a PolyLine with more than 1 section.
 
-        import folium
-        from collections import namedtuple
-        import numpy as np
-        Point = namedtuple('Point', field_names=['lat', 'lon'])
-
-        # creating point from our Point named tuple
-        p1 = Point(locations[0][0], locations[0][1])
-        p2 = Point(locations[1][0], locations[1][1])
+        lat1, lon1 = locations[0][0], locations[0][1]
+        lat2, lon2 = locations[1][0], locations[1][1]
 
         # getting the rotation needed for our marker.
         # Subtracting 90 to account for the marker's orientation
         # of due East(get_bearing returns North)
-        rotation = MapManager.get_bearing(p1, p2) - 90
+        rotation = MapManager.get_bearing_lat_lon(lat1, lon1, lat2, lon2) - 90
 
         # get an evenly space list of lats and lons for our arrows
         # note that I'm discarding the first and last for aesthetics
         # as I'm using markers to denote the start and end
-        arrow_lats = np.linspace(p1.lat, p2.lat, n_arrows + 2)[1:n_arrows + 1]
-        arrow_lons = np.linspace(p1.lon, p2.lon, n_arrows + 2)[1:n_arrows + 1]
-
-        arrows = []
+        if n_arrows < 32:
+            # For the typical small number of arrows, plain Python is faster than the numpy call overhead
+            step = 1 / (n_arrows + 1)
+            arrow_locations = [(lat1 + (lat2 - lat1) * i * step, lon1 + (lon2 - lon1) * i * step)
+                               for i in range(1, n_arrows + 1)]
+        else:
+            # One 2-D linspace over (lat, lon) instead of one per coordinate
+            arrow_locations = np.linspace([lat1, lon1], [lat2, lon2], n_arrows + 2)[1:-1].tolist()
+
+        # The marker properties are the same for all arrows
+        marker_kwargs = dict(fill_color=color, number_of_sides=3, radius=size, rotation=rotation)
+        regular_polygon_marker = folium.RegularPolygonMarker
 
         # creating each "arrow" and appending them to our arrows list
-        for points in zip(arrow_lats, arrow_lons):
-            arrows.append(folium.RegularPolygonMarker(location=points,
-                                                      fill_color=color, number_of_sides=3,
-                                                      radius=size, rotation=rotation).add_to(add_to))
+        arrows = [regular_polygon_marker(location=location, **marker_kwargs).add_to(add_to)
+                  for location in arrow_locations]
         return arrows
 
     # @staticmethod
@@ -203,25 +293,28 @@ class MapManager(object):
     #     return arrows
 
     @staticmethod
-    def get_html_table(rows):
+    def get_html_table(rows, escape: bool = False):
         """Creates 2 column html table for use in popups.
         Args:
             rows: List of sequences. Each sequence should have 2 string entries, one for each column
+            escape (bool): If True, HTML-escapes the entries (e.g. quotes, '<', '&').
+                Default False, so entries may contain HTML markup.
 
         Returns:
             html: a HTML formatted table of two columns
         """
         table_html_pattern = """<table style="width:100%">{}</table>"""
         # row_html_pattern = """<tr><td>{}:&nbsp</td><td>{}</td></tr>"""
-        row_html_pattern = """<tr><td>{}&nbsp</td><td>{}</td></tr>"""
-        rows_html = ''
-        for row in rows:
-            rows_html = rows_html + '\n' + row_html_pattern.format(row[0], row[1])
-        html = table_html_pattern.format(rows_html)
-        return html
+        row_html_pattern = """<tr><td>%s&nbsp</td><td>%s</td></tr>"""  # %-format: cheaper than str.format per row
+        if escape:
+            rows = [(html.escape(str(row[0])), html.escape(str(row[1]))) for row in rows]
+        # Each row is preceded by a newline. Join a list (not a generator): join needs a sequence anyway.
+        row_parts = [row_html_pattern % (row[0], row[1]) for row in rows]
+        rows_html = '\n' + '\n'.join(row_parts) if row_parts else ''
+        return table_html_pattern.format(rows_html)
 
     @staticmethod
-    def get_popup_table(rows):
+    def get_popup_table(rows, escape: bool = False):
         """Return a popup table to add as a popup/child to a folium element.
 
         Usage::
@@ -245,20 +338,20 @@ class MapManager(object):
 
         Args:
             rows: List of sequences. Each sequence should have 2 string entries, one for each column.
+            escape (bool): If True, HTML-escapes the entries. See `get_html_table`.
 
         Returns:
             popup (folium.Popup)
 
         Notes
         Beware that a quote in the texts causes a problem (no map shows).
-        This can be avoided by replacing the "\'" with something else.
+        This can be avoided by replacing the "\'" with something else, or by using `escape=True`.
         Unfortunately the option `parse_html=True` does not prevent the problem.
         Despite the suggestion in https://nbviewer.jupyter.org/github/python-visualization/folium/blob/master/examples/Popups.ipynb
         """
-        import folium
-        html_text = MapManager.get_html_table(rows)
-        html = folium.Html(html_text, script=True)
-        popup = folium.Popup(html, parse_html=True, max_width=2650)
+        html_text = MapManager.get_html_table(rows, escape=escape)
+        # A str is wrapped by folium in an Html(script=True) element, no need for an explicit folium.Html
+        popup = folium.Popup(html_text, max_width=2650)
         return popup
 
     @staticmethod
@@ -298,20 +391,31 @@ class MapManager(object):
             tooltips = []
         if quantities is None:
             quantities = []
-        if border_colors is None:
-            import plotly.express as px
-            border_colors=px.colors.qualitative.Dark2  #['green', 'blue', 'red']
-        if background_colors is None:
-            import plotly.express as px
-            background_colors=px.colors.qualitative.Set2  #['lightgreen', 'lightblue', 'lightred']
-
+        if border_colors is None or background_colors is None:
+            px = _get_plotly_express()
+            if border_colors is None:
+                border_colors=px.colors.qualitative.Dark2  #['green', 'blue', 'red']
+            if background_colors is None:
+                background_colors=px.colors.qualitative.Set2  #['lightgreen', 'lightblue', 'lightred']
+
+        # Collect the bars in one FeatureGroup that is added to the map once. control=False: no entry in the LayerControl
+        bar_chart = folium.FeatureGroup(name='bar_chart', control=False)
+        # Bar heights and colors for all bars in one pass. tolist(): plain Python ints for the folium JSON serialization
+        # A missing (NaN) or infinite quantity gets a bar of height 0
+        n_bars = len(quantities)
+        bar_heights = np.asarray(quantities, dtype=float) * bar_height_per_unit
+        bar_heights = np.rint(np.where(np.isfinite(bar_heights), bar_heights, 0.0)).astype(int).tolist()
+        n_border_colors = len(border_colors)
+        n_background_colors = len(background_colors)
+        bar_border_colors = [border_colors[i % n_border_colors] for i in range(n_bars)]  # cycle back through colors
+        bar_background_colors = [background_colors[i % n_background_colors] for i in range(n_bars)]
         bar_anchor_x = 0
-        for i in range(len(quantities)):
-            bar_height = round(quantities[i] * bar_height_per_unit)
+        for i in range(n_bars):
+            bar_height = bar_heights[i]
             icon = BeautifyIcon(
                 icon_shape='rectangle-dot',
-                border_color=border_colors[i%len(border_colors)], # cycle back through colors
-                background_color=background_colors[i%len(background_colors)], # cycle back through colors
+                border_color=bar_border_colors[i],
+                background_color=bar_background_colors[i],
                 border_width=1,
                 icon_size=[bar_width, bar_height],
                 icon_anchor=[bar_anchor_x, bar_height]
@@ -322,7 +426,8 @@ class MapManager(object):
                 tooltip = tooltips[i]
             else:
                 tooltip = f"value = {quantities[i]}"
-            Marker(coord, tooltip=tooltip, icon=icon).add_to(m)
+            Marker(coord, tooltip=tooltip, icon=icon).add_to(bar_chart)
+        bar_chart.add_to(m)
 
 
 
@@ -10,7 +10,11 @@
 
 import pandas as pd
 import os
-from typing import Sequence, List, Dict, Tuple, Optional
+import functools
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Sequence, List, Dict, Tuple, Optional, NamedTuple
 
 #  Typing aliases
 Inputs = Dict[str, pd.DataFrame]
@@ -20,13 +24,27 @@ InputsOutputs = Tuple[Inputs, Outputs]
 try:
     # Import as part of package
     from .scenariomanager import ScenarioManager
-except:
+except ImportError:
     # import as part of DO Model Builder
     from scenariomanager import ScenarioManager
 
 # from dse_do_utils import ScenarioManager
 
 
+class _Environment(NamedTuple):
+    is_cpd40: bool
+    is_cpd25: bool
+    is_dsx: bool
+
+
+@functools.lru_cache(maxsize=1)
+def _detect_environment() -> _Environment:
+    """Detects the environment once per process. In particular `env_is_cpd40` is relatively expensive."""
+    return _Environment(is_cpd40=ScenarioManager.env_is_cpd40(),
+                        is_cpd25=ScenarioManager.env_is_cpd25(),
+                        is_dsx=ScenarioManager.env_is_dsx())
+
+
 class MultiScenarioManager(object):
     """Manages multiple scenarios from same DO Model/Experiment.
     Can export all scenarios in one Excel spreadsheet, where it adds the scenario_name as an additional column.
@@ -51,7 +69,7 @@ class MultiScenarioManager(object):
 
     """
 
-    def __init__(self, model_name: Optional[str] = None, scenario_names: List[str] = [],
+    def __init__(self, model_name: Optional[str] = None, scenario_names: Optional[List[str]] = None,
                  local_root: Optional[str] = None, project_id: Optional[str] = None,
                  project_access_token: Optional[str] = None, project=None):
         """Create a MultiScenarioManager.
@@ -69,12 +87,17 @@ class MultiScenarioManager(object):
         self.project_id = project_id
         self.project_access_token = project_access_token
         self.project = project
-        self.scenarios_df = self.get_scenarios_df(scenario_names)
-        if scenario_names is None:
-            #             self.scenario_names = self.get_all_scenario_names()
-            self.scenario_names = list(self.scenarios_df.scenario_name)
+        self._dd_client = None
+        self._model_builder = None
+        self._thread_local = threading.local()  # Client for loading the scenarios, per thread. See `get_scenario_client`
+        if scenario_names:
+            # No need to retrieve the scenarios from the model
+            self.scenario_names = list(scenario_names)
+            self.scenarios_df = pd.DataFrame({'scenario_name': self.scenario_names})
         else:
-            self.scenario_names = scenario_names
+            # All scenarios in the model
+            self.scenarios_df = self.get_scenarios_df(None)
+            self.scenario_names = list(self.scenarios_df.scenario_name)
         self.inputs_by_scenario: Dict[str, Inputs] = {}
         self.outputs_by_scenario: Dict[str, Outputs] = {}
         self.inputs = None
@@ -82,6 +105,41 @@ class MultiScenarioManager(object):
 
     def get_dd_client(self):
         """Return the Client managing the DO scenario.
+        The Client is created once and re-used, e.g. by `get_scenarios_df`.
+        Returns: dd_scenario.Client
+        """
+        if self._dd_client is None:
+            self._dd_client = self._create_dd_client()
+        return self._dd_client
+
+    def get_model_builder(self):
+        """Return the DO model builder of the model_name. Is retrieved once and re-used.
+
+        Raises:
+            ValueError: When the model_name doesn't match an existing DO model.
+        """
+        if self._model_builder is None:
+            model_builder = self.get_dd_client().get_model_builder(name=self.model_name)
+            if model_builder is None:
+                raise ValueError('No DO model with name `{}` exists'.format(self.model_name))
+            self._model_builder = model_builder
+        return self._model_builder
+
+    def get_scenario_client(self):
+        """Return the Client used by the ScenarioManager to load the scenarios, see `load_data_from_scenario`.
+        The Client is created once per thread and re-used for all scenarios loaded in that thread.
+        (The Client is not documented as thread-safe.)
+        Returns: decision_optimization_client.Client
+        """
+        client = getattr(self._thread_local, 'scenario_client', None)
+        if client is None:
+            client = ScenarioManager(self.model_name, None, self.local_root, self.project_id,
+                                     self.project_access_token, self.project).get_dd_client()
+            self._thread_local.scenario_client = client
+        return client
+
+    def _create_dd_client(self):
+        """Return a new Client managing the DO scenario.
         Returns: new dd_scenario.Client
         """
         from dd_scenario import Client
@@ -101,9 +159,11 @@ class MultiScenarioManager(object):
             return Client()
 
     def load_data_from_scenario(self, scenario_name):
-        """TODO: see of by re-using a Client, this can be done faster"""
+        """Loads the inputs and outputs of a scenario, using a ScenarioManager.
+        The ScenarioManager re-uses the Client of `get_scenario_client`, instead of creating a new Client per scenario.
+        """
         sm = ScenarioManager(self.model_name, scenario_name, self.local_root, self.project_id,
-                             self.project_access_token, self.project)
+                             self.project_access_token, self.project, client=self.get_scenario_client())
         inputs, outputs = sm.load_data_from_scenario()
         return inputs, outputs
 
@@ -116,16 +176,17 @@ class MultiScenarioManager(object):
 
         :return: path to the datasets folder
         """
-        if ScenarioManager.env_is_cpd40():
+        env = _detect_environment()
+        if env.is_cpd40:
             from ibm_watson_studio_lib import access_project_or_space
             wslib = access_project_or_space()
             data_dir = wslib.mount.get_base_dir()
         elif self.env_is_wscloud():
             data_dir = '/home/dsxuser/work'  # or use os.environ['PWD'] ?
-        elif ScenarioManager.env_is_cpd25():
+        elif env.is_cpd25:
             # Note that the data dir in CPD25 is not an actual real directory and is NOT in the hierarchy of the JupyterLab folder
             data_dir = '/project_data/data_asset'  # Do NOT use the os.path.join!
-        elif ScenarioManager.env_is_dsx():
+        elif env.is_dsx:
             data_dir = os.path.join(self.get_root_directory(),
                                     'datasets')  # Do we need to add an empty string at the end?
         else:  # Local file system
@@ -138,9 +199,10 @@ class MultiScenarioManager(object):
         Raises:
             ValueError if root directory doesn't exist.
         """
-        if ScenarioManager.env_is_cpd25():
+        env = _detect_environment()
+        if env.is_cpd25:
             root_dir = '.'
-        elif ScenarioManager.env_is_dsx():  # Note that this is False in DO! So don't run in DO
+        elif env.is_dsx:  # Note that this is False in DO! So don't run in DO
             root_dir = os.environ['DSX_PROJECT_DIR']
         else:
             if self.local_root is None:
@@ -171,16 +233,45 @@ class MultiScenarioManager(object):
         with open(file_path, 'rb') as f:
             self.project.save_data(file_name=file_name, data=f, overwrite=True)
 
-    def get_multi_scenario_data(self, scenario_names: List[str] = None):
+    def get_multi_scenario_data(self, scenario_names: List[str] = None, max_workers: int = 8,
+                                retain_per_scenario: bool = True, categorical_scenario_name: bool = False):
+        """Loads the data from the scenarios and merges the tables.
+        The scenarios are loaded concurrently in a thread-pool, since loading is dominated by the web-requests.
+        The merged tables in `self.inputs` and `self.outputs` include all scenarios in `self.inputs_by_scenario`
+        and `self.outputs_by_scenario`, i.e. also the scenarios loaded in earlier calls.
+
+        Args:
+            scenario_names (List[str]): names of the scenarios. If None, uses the self.scenario_names
+            max_workers (int): maximum number of threads. Use 1 to load the scenarios sequentially.
+            retain_per_scenario (bool): If True, keeps the loaded data in `self.inputs_by_scenario` and
+                `self.outputs_by_scenario`. Set to False to reduce the peak memory for large scenarios:
+                the tables of each scenario are then collected for the merge as soon as the scenario is loaded,
+                and the merged tables only include the scenarios of this call.
+            categorical_scenario_name (bool): If True, the scenario_name column of the merged tables is a categorical,
+                with the scenario names as categories. Uses less memory than the default string (object) column.
+        """
         if scenario_names is None:
             scenario_names = self.scenario_names
-        for scenario_name in scenario_names:
-            inputs, outputs = self.load_data_from_scenario(scenario_name)
-            self.inputs_by_scenario[scenario_name] = inputs
-            self.outputs_by_scenario[scenario_name] = outputs
-        self.inputs = MultiScenarioManager.merge_scenario_data(self.inputs_by_scenario)
+        scenario_categories = list(dict.fromkeys(scenario_names)) if categorical_scenario_name else None
+        input_dfs_by_table: Dict[str, List[pd.DataFrame]] = defaultdict(list)
+        output_dfs_by_table: Dict[str, List[pd.DataFrame]] = defaultdict(list)
+        n_workers = max(1, min(max_workers, len(scenario_names)))
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            for scenario_name, (inputs, outputs) in zip(scenario_names,
+                                                        executor.map(self.load_data_from_scenario, scenario_names)):
+                if retain_per_scenario:
+                    self.inputs_by_scenario[scenario_name] = inputs
+                    self.outputs_by_scenario[scenario_name] = outputs
+                else:
+                    MultiScenarioManager._collect_scenario_tables(input_dfs_by_table, scenario_name, inputs, scenario_categories)
+                    MultiScenarioManager._collect_scenario_tables(output_dfs_by_table, scenario_name, outputs, scenario_categories)
+        if retain_per_scenario:
+            self.inputs = MultiScenarioManager.merge_scenario_data(self.inputs_by_scenario, categorical_scenario_name)
+            self.outputs = MultiScenarioManager.merge_scenario_data(self.outputs_by_scenario, categorical_scenario_name)
+        else:
+            self.inputs = MultiScenarioManager._concat_tables(input_dfs_by_table)
+            self.outputs = MultiScenarioManager._concat_tables(output_dfs_by_table)
         self.inputs['Scenario'] = self.scenarios_df  # Adding the Scenarios as a reference table
-        self.outputs = MultiScenarioManager.merge_scenario_data(self.outputs_by_scenario)
 
     def write_data_to_excel(self, excel_file_name: str = None) -> None:
         """Write inputs and/or outputs to an Excel file in datasets.
@@ -203,38 +294,77 @@ class MultiScenarioManager(object):
         # Save the regular Excel file:
         data_dir = self.get_data_directory()
         excel_file_path = os.path.join(data_dir, excel_file_name + '.xlsx')
-        writer = pd.ExcelWriter(excel_file_path, engine='xlsxwriter')
-        ScenarioManager.write_data_to_excel_s(writer, inputs=self.inputs, outputs=self.outputs)
-        writer.save()
-        if ScenarioManager.env_is_cpd25():
+        # Note: the xlsxwriter option `constant_memory` cannot be used: pandas.to_excel writes the cells column by column,
+        # while constant_memory requires row-by-row writing (it silently drops the earlier rows)
+        with pd.ExcelWriter(excel_file_path, engine='xlsxwriter') as writer:
+            ScenarioManager.write_data_to_excel_s(writer, inputs=self.inputs, outputs=self.outputs)
+        if _detect_environment().is_cpd25:
             self.add_data_file_to_project(excel_file_path, excel_file_name + '.xlsx')
         return excel_file_path
 
+    def write_data_to_parquet(self, directory_name: str = None) -> str:
+        """Write inputs and outputs as .parquet files (one per table) in a sub-directory of datasets.
+        Alternative for `write_data_to_excel`: much faster to write and read, smaller files,
+        and preserves the column types (e.g. a categorical `scenario_name`).
+
+        If the directory_name is None, it will be generated from the model_name: MODEL_NAME + "_multi_output"
+
+        Args:
+            directory_name (str): The name of the sub-directory for the parquet files.
+
+        Returns:
+            directory_path (str): full path of the directory
+        """
+        if directory_name is None:
+            if self.model_name is not None:
+                directory_name = f"{self.model_name}_multi_output"
+            else:
+                raise ValueError(
+                    "The argument directory_name can only be 'None' if the model_name '{}' has been specified.".format(
+                        self.model_name))
+
+        directory_path = os.path.join(self.get_data_directory(), directory_name)
+        os.makedirs(directory_path, exist_ok=True)
+        ScenarioManager.write_data_to_parquet_s(directory_path, inputs=self.inputs, outputs=self.outputs)
+        return directory_path
+
     @staticmethod
-    def merge_scenario_data(data_by_scenario: Dict[str, Dict[str, pd.DataFrame]]) -> Dict[str, pd.DataFrame]:
-        """Add scenario_name as column. Merge tables"""
-        merged_data_dict = {}
+    def merge_scenario_data(data_by_scenario: Dict[str, Dict[str, pd.DataFrame]],
+                            categorical_scenario_name: bool = False) -> Dict[str, pd.DataFrame]:
+        """Add scenario_name as column. Merge tables.
+        Collects the tables per table_name and concatenates them once, instead of appending one scenario at a time.
+        Does not modify the DataFrames in data_by_scenario.
+        If categorical_scenario_name, the scenario_name column is a categorical, with the scenario names as categories."""
+        scenario_categories = list(data_by_scenario.keys()) if categorical_scenario_name else None
+        dfs_by_table: Dict[str, List[pd.DataFrame]] = defaultdict(list)
         for scenario, data_dict in data_by_scenario.items():
             #             print(f"Merge scenario {scenario}")
-            for table_name, df in data_dict.items():
-                #                 print(f"Merge scenario {scenario} - table {table_name}")
-                df['scenario_name'] = scenario
-                if table_name in merged_data_dict.keys():
-                    existing_df = merged_data_dict[table_name]
-                    # TODO: what will happen if the 2 dataframes have different columns? A: you get both columns and NaN values
-                    existing_df = existing_df.append(df, ignore_index=True, sort=False)
-                    merged_data_dict[table_name] = existing_df
-                else:
-                    merged_data_dict[table_name] = df
-        return merged_data_dict
+            MultiScenarioManager._collect_scenario_tables(dfs_by_table, scenario, data_dict, scenario_categories)
+        return MultiScenarioManager._concat_tables(dfs_by_table)
+
+    @staticmethod
+    def _collect_scenario_tables(dfs_by_table: Dict[str, List[pd.DataFrame]], scenario: str,
+                                 data_dict: Dict[str, pd.DataFrame], scenario_categories: Optional[List[str]]) -> None:
+        """Appends the tables of one scenario, with a scenario_name column, to the lists in dfs_by_table.
+        If scenario_categories is not None, the scenario_name column is a categorical with these categories."""
+        for table_name, df in data_dict.items():
+            #                 print(f"Merge scenario {scenario} - table {table_name}")
+            if scenario_categories is None:
+                scenario_name = scenario
+            else:
+                scenario_name = pd.Categorical([scenario] * len(df), categories=scenario_categories)
+            dfs_by_table[table_name].append(df.assign(scenario_name=scenario_name))
+
+    @staticmethod
+    def _concat_tables(dfs_by_table: Dict[str, List[pd.DataFrame]]) -> Dict[str, pd.DataFrame]:
+        """Concatenates the collected DataFrames per table."""
+        # If 2 dataframes have different columns, you get both columns and NaN values
+        return {table_name: pd.concat(dfs, ignore_index=True, sort=False)
+                for table_name, dfs in dfs_by_table.items()}
 
     def get_all_scenario_names(self):
         """Deprecated. Replaced by get_scenarios_df"""
-        names = []
-        client = self.get_dd_client()
-        model_builder = client.get_model_builder(name=self.model_name)
-        if model_builder is None:
-            raise ValueError('No DO model with name `{}` exists'.format(self.model_name))
+        model_builder = self.get_model_builder()
         names = model_builder.get_scenarios(as_dict=True)
         return list(names.keys())
 
@@ -245,13 +375,9 @@ class MultiScenarioManager(object):
         For now, the only column in the df is the scenario_name.
         More can be added later.
         """
-        names = []
-        client = self.get_dd_client()
-        model_builder = client.get_model_builder(name=self.model_name)
-        if model_builder is None:
-            raise ValueError('No DO model with name `{}` exists'.format(self.model_name))
+        model_builder = self.get_model_builder()
         scenarios_dict = model_builder.get_scenarios(as_dict=True)
         df = pd.DataFrame({'scenario_name': list(scenarios_dict.keys())})
         if scenario_names is not None:
-            df = df.query("scenario_name in @scenario_names")
+            df = df[df['scenario_name'].isin(scenario_names)].reset_index(drop=True)
         return df
\ No newline at end of file
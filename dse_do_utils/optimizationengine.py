@@ -6,17 +6,22 @@
 # OptimizationEngine
 # -----------------------------------------------------------------------------------
 # -----------------------------------------------------------------------------------
+import functools
+import operator
 import pathlib
+import shutil
 
 import docplex
+import numpy as np
 import pandas as pd
 import os
-from docplex.mp.conflict_refiner import ConflictRefiner
 from docplex.mp.progress import SolutionListener
 from docplex.mp.model import Model
 # from docplex.cp.model import CpoModel
 import docplex.cp.model as cp
-from typing import Sequence, List, Dict, Tuple, Optional, Union
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Sequence, List, Dict, Tuple, Optional, Union, Callable
 
 # from dse_do_utils import ScenarioManager
 # Note that when in a package, we need to import from another modules in this package slightly differently (with the dot)
@@ -25,19 +30,115 @@ from docplex.mp.vartype import IntegerVarType, ContinuousVarType, BinaryVarType,
 
 try:
     # Import as part of package
-    from .scenariomanager import ScenarioManager
     from .datamanager import DataManager
 except ImportError:
     # import as part of DO Model Builder
-    from scenariomanager import ScenarioManager
     from datamanager import DataManager
 
+# The ScenarioManager is only needed for the exports. It is imported on first use, see `_get_scenario_manager_class()`.
+_SM = None
+
+
+def _get_scenario_manager_class():
+    """Returns the ScenarioManager class. Imported once, on first use."""
+    global _SM
+    if _SM is None:
+        try:
+            # Import as part of package
+            from .scenariomanager import ScenarioManager
+        except ImportError:
+            # import as part of DO Model Builder
+            from scenariomanager import ScenarioManager
+        _SM = ScenarioManager
+    return _SM
+
 from typing import TypeVar, Generic
 
 DM = TypeVar('DM', bound='DataManager')
 
 
+@functools.lru_cache(maxsize=8)
+def _get_datasets_dir(local_root: Optional[str]) -> str:
+    """Returns the data directory of a ScenarioManager for the local_root.
+    Cached, so that exporting many models doesn't redo the platform detection for each export."""
+    return _get_scenario_manager_class()(local_root=local_root).get_data_directory()
+
+
+_PLATFORM = None  # Platform for registering exported files as data assets. Detected on first use, see `_get_platform()`
+
+
+def _get_platform():
+    """Returns the Platform, as detected by `ScenarioManager.detect_platform()`. Detected once, on first use."""
+    global _PLATFORM
+    if _PLATFORM is None:
+        _PLATFORM = _get_scenario_manager_class().detect_platform()
+    return _PLATFORM
+
+
+def _set_platform(platform):
+    """Overrides the detected Platform, e.g. for tests. If None, the platform is detected again on next use."""
+    global _PLATFORM
+    _PLATFORM = platform
+
+
+_PREP_SCAL_COEFS_NB = None  # numba kernel for `prepare_coefs`. Defined on first use, see `_get_prep_scal_coefs_nb()`
+
+
+def _get_prep_scal_coefs_nb():
+    """Returns the numba kernel for `OptimizationEngine.prepare_coefs`, or False if numba is not installed.
+    numba (optional) is a heavy import, so it is only imported and the kernel defined on first use."""
+    global _PREP_SCAL_COEFS_NB
+    if _PREP_SCAL_COEFS_NB is None:
+        try:
+            import numba
+        except ImportError:
+            _PREP_SCAL_COEFS_NB = False
+            return _PREP_SCAL_COEFS_NB
+
+        @numba.njit(cache=True, parallel=True)
+        def _prep_scal_coefs_nb(w, m, out):
+            """Row-weighted coefficients for a 1-D float64 `w` and 2-D float64 `m`. Fills `out` in row-major order."""
+            n_cols = m.shape[1]
+            for i in numba.prange(m.shape[0]):
+                for j in range(n_cols):
+                    out[i * n_cols + j] = w[i] * m[i, j]
+
+        _PREP_SCAL_COEFS_NB = _prep_scal_coefs_nb
+    return _PREP_SCAL_COEFS_NB
+
+
+# Path separator for the export file names. The datasets dir is already a resolved directory,
+# so the file names are built with an f-string instead of the more general os.path.join.
+_SEP = os.sep
+
+# Background writer for export_as_lp_s/export_as_cpo_s(async_write=True). Threads are only started on first use.
+_export_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='model_export')
+
+
+def _build_and_solve(builder: Callable[[], 'OptimizationEngine'], solve_kwargs: Dict) -> Tuple[Optional[float], Optional[pd.DataFrame]]:
+    """Worker for `OptimizationEngine.solve_batch`: builds the engine, solves and returns (objective value, KPI table).
+    Returns (None, None) if no solution was found. The SolveSolution itself is not returned, since it references the model."""
+    engine = builder()
+    msol = engine.solve(**solve_kwargs)
+    if msol is None:
+        return None, None
+    return msol.objective_value, engine.get_kpi_output_table()
+
+
+def _clear_export_cache():
+    """Clears the cached data directories and platform used by the export methods."""
+    _get_datasets_dir.cache_clear()
+    _set_platform(None)
+
+
 class OptimizationEngine(Generic[DM]):
+    # Slots for all attributes, so instances don't have a __dict__. '__weakref__' is included to allow weak references.
+    # Subclasses without __slots__ do get a __dict__, so they can still add their own attributes.
+    __slots__ = ('is_cpo_model', 'mdl', 'dm', 'solve_kwargs', 'export_lp', 'export_sav', 'export_lp_path',
+                 '_var_series_cache', '_last_solution', '_kpi_cache', '__weakref__')
+    numba_min_coefs = 100000  # Minimum number of coefficients for `prepare_coefs` to use the numba kernel (if installed)
+    print_solution_max_vars = 10000  # By default, `solve` only prints the full solution of models with fewer variables
+
     def __init__(self, data_manager: Optional[DM] = None, name: str = "MyOptimizationEngine",
                  solve_kwargs = None, export_lp: bool = False, export_sav: bool = False, export_lp_path: str = None, is_cpo_model: bool = False):
         self.is_cpo_model = is_cpo_model
@@ -48,6 +149,10 @@ class OptimizationEngine(Generic[DM]):
         self.export_lp = export_lp
         self.export_sav = export_sav  # TODO: add export to sav
         self.export_lp_path = export_lp_path
+        # (mdl, {(var type, id(df.index), kargs) -> (index, Series)}). See `_get_var_series`
+        self._var_series_cache = (self.mdl, {})
+        self._last_solution = None  # SolveSolution of the last successful solve(). See `add_warm_start`
+        self._kpi_cache = None  # (solution, KPIs, KPI values). See `get_kpi_output_table`
 
     def create_do_model(self, name: str, is_cpo_model: bool = False, **kwargs) -> Union[Model, cp.CpoModel]:
         """Create a model (.mdl). By default a CPLEX model (mp.Model), or a CP Optimizer model (cp.Model)
@@ -62,48 +167,211 @@ class OptimizationEngine(Generic[DM]):
             mdl = Model(name=name, **kwargs)
         return mdl
 
-    def integer_var_series(self, df: pd.DataFrame, **kargs) -> pd.Series:
+    def integer_var_series(self, df: pd.DataFrame, cached: bool = False, **kargs) -> pd.Series:
         """Create a Series of integer dvar for each row in the DF. Most effective method. Best practice.
         Result can be assigned to a column of the df.
         Usage:
         df['xDVar'] = mdl.integer_var_series(df, name = 'xDVar')
 
+        To build expressions from dvar columns, prefer `scal_prod_s`, `sum_vars_s` and `groupby_scal_prod_s`
+        over Python generators like `mdl.sum(df.coef[i] * df.xDVar[i] for i in df.index)`.
+
         Args:
             self (docplex.mp.model): CPLEX Model
             df (DataFrame): dataframe
-            **kargs: arguments passed to mdl.integer_var_list method. E.g. 'name'
+            cached (bool): If True, return the dvars created by an earlier cached call with the same df.index and kargs,
+                instead of creating new dvars. See `_get_var_series`.
+            **kargs: arguments passed to mdl.integer_var_list method. E.g. 'name'.
+                Also 'positional_names': if True, name the dvars by row position instead of index keys. Faster.
 
         Returns:
             (pandas.Series) with integer dvars (IntegerVarType), index matches index of df
         """
         # We are re-using the index from the DF index:
-        return OptimizationEngine.integer_var_series_s(self.mdl, df, **kargs)
+        return self._get_var_series(OptimizationEngine.integer_var_series_s, df, cached, kargs)
         # return pd.Series(self.mdl.integer_var_list(df.index, **kargs), index = df.index)
 
-    def continuous_var_series(self, df, **kargs) -> pd.Series:
+    def continuous_var_series(self, df, cached: bool = False, **kargs) -> pd.Series:
         """Returns pd.Series[ContinuousVarType]"""
-        return OptimizationEngine.continuous_var_series_s(self.mdl, df, **kargs)
+        return self._get_var_series(OptimizationEngine.continuous_var_series_s, df, cached, kargs)
         # return pd.Series(self.mdl.continuous_var_list(df.index, **kargs), index = df.index)
 
-    def binary_var_series(self, df, **kargs) -> pd.Series:
+    def binary_var_series(self, df, cached: bool = False, **kargs) -> pd.Series:
         """Returns pd.Series[BinaryVarType]"""
-        return OptimizationEngine.binary_var_series_s(self.mdl, df, **kargs)
+        return self._get_var_series(OptimizationEngine.binary_var_series_s, df, cached, kargs)
         # return pd.Series(self.mdl.binary_var_list(df.index, **kargs), index = df.index)
 
+    def var_dataframe(self, df: pd.DataFrame, var_specs: Dict[str, Dict]) -> pd.DataFrame:
+        """Returns a copy of the df with a dvar column for each entry in var_specs.
+        Keeps the dvars in the same DataFrame as the coefficient columns, so expressions can be built
+        column-wise, e.g. with `scal_prod_s(mdl, df.xDVar, df.cost)`.
+
+        Usage:
+            df = engine.var_dataframe(df, {'xDVar': dict(vartype='integer', ub=10), 'yDVar': dict(vartype='binary')})
+
+        Args:
+            df (DataFrame): dataframe
+            var_specs (Dict[str, Dict]): column name -> keyword arguments for the dvar series.
+                The 'vartype' is one of 'integer', 'continuous' (default) or 'binary'.
+                The other arguments are passed to the `*_var_series` method. If no 'name' is given, the column name is used.
+        Returns:
+            (DataFrame) copy of the df with the dvar columns added
+        """
+        create_fns = {'integer': self.integer_var_series, 'continuous': self.continuous_var_series,
+                      'binary': self.binary_var_series}
+        columns = {}
+        for column, spec in var_specs.items():
+            kargs = dict(spec)
+            vartype = kargs.pop('vartype', 'continuous')
+            if vartype not in create_fns:
+                raise ValueError(f"Unsupported vartype '{vartype}' for column '{column}'. Use one of {list(create_fns)}")
+            kargs.setdefault('name', column)
+            columns[column] = create_fns[vartype](df, **kargs)
+        return df.assign(**columns)
+
+    def _get_var_series(self, create_fn, df: pd.DataFrame, cached: bool, kargs: dict) -> pd.Series:
+        """Returns the dvar Series created by `create_fn(self.mdl, df, **kargs)`.
+        If cached, re-uses the dvars of an earlier cached call on the same df.index object and kargs.
+        This avoids re-creating the dvars when the same dvar column is requested repeatedly for the same model,
+        e.g. when building several DataFrames on the same index.
+        Note that the cache returns the SAME dvars, not new ones. Calls with cached=False always create new dvars.
+        The cache is per model: it is cleared when self.mdl is replaced by another model.
+        """
+        if not cached:
+            return create_fn(self.mdl, df, **kargs)
+        try:
+            key = (create_fn.__name__, id(df.index), tuple(sorted(kargs.items())))
+            hash(key)
+        except TypeError:  # Unhashable kargs, e.g. a list of bounds
+            return create_fn(self.mdl, df, **kargs)
+        if self._var_series_cache[0] is not self.mdl:
+            self._var_series_cache = (self.mdl, {})
+        cache = self._var_series_cache[1]
+        hit = cache.get(key)
+        if hit is not None and hit[0] is df.index:  # The cache holds a reference to the index, so its id cannot be re-used
+            return pd.Series(hit[1].values, index=df.index, copy=False)
+        var_series = create_fn(self.mdl, df, **kargs)
+        cache[key] = (df.index, var_series)
+        return var_series
+
+    @staticmethod
+    def _object_series(values: list, index: pd.Index) -> pd.Series:
+        """Returns a Series of dtype object from a list, e.g. of dvars.
+        Builds the object array with np.fromiter, which is much faster than the np.array(values, dtype=object)
+        that pd.Series does internally (which probes every element for nested sequences).
+        """
+        try:
+            array = np.fromiter(values, dtype=object, count=len(values))
+        except ValueError:  # numpy < 1.23 does not support dtype=object in fromiter
+            return pd.Series(values, index=index, dtype='object')
+        return pd.Series(array, index=index, copy=False)
+
+    # Note: docplex formats the dvar names from the 'name' and the index keys itself, at little cost.
+    # Passing a pre-computed list of names (e.g. built with np.char.add) is slower, because docplex then checks the list.
+    # With positional_names=True, the dvars are created from the number of rows instead of the index keys.
+    # This skips iterating the (Multi)Index in docplex, about 35% faster on large models,
+    # but the names are based on the row position (e.g. 'x_5') instead of the index keys (e.g. 'x_0_5').
     @staticmethod
-    def integer_var_series_s(mdl: docplex.mp.model, df: pd.DataFrame, **kargs) -> pd.Series:
+    def integer_var_series_s(mdl: docplex.mp.model, df: pd.DataFrame, positional_names: bool = False, **kargs) -> pd.Series:
         """Returns pd.Series[IntegerVarType]"""
-        return pd.Series(mdl.integer_var_list(df.index, **kargs), index=df.index, dtype='object')
+        keys = df.shape[0] if positional_names else df.index
+        return OptimizationEngine._object_series(mdl.integer_var_list(keys, **kargs), df.index)
 
     @staticmethod
-    def continuous_var_series_s(mdl: docplex.mp.model, df: pd.DataFrame, **kargs) -> pd.Series:
+    def continuous_var_series_s(mdl: docplex.mp.model, df: pd.DataFrame, positional_names: bool = False, **kargs) -> pd.Series:
         """Returns pd.Series[ContinuousVarType]."""
-        return pd.Series(mdl.continuous_var_list(df.index, **kargs), index=df.index, dtype='object')
+        keys = df.shape[0] if positional_names else df.index
+        return OptimizationEngine._object_series(mdl.continuous_var_list(keys, **kargs), df.index)
 
     @staticmethod
-    def binary_var_series_s(mdl: docplex.mp.model, df: pd.DataFrame, **kargs) -> pd.Series:
+    def binary_var_series_s(mdl: docplex.mp.model, df: pd.DataFrame, positional_names: bool = False, **kargs) -> pd.Series:
         """Returns pd.Series[BinaryVarType]"""
-        return pd.Series(mdl.binary_var_list(df.index, **kargs), index=df.index, dtype='object')
+        keys = df.shape[0] if positional_names else df.index
+        return OptimizationEngine._object_series(mdl.binary_var_list(keys, **kargs), df.index)
+
+    @staticmethod
+    def scal_prod_s(mdl: docplex.mp.model, var_series: pd.Series, coef_series: Union[pd.Series, np.ndarray, Sequence]):
+        """Returns the linear expression sum(coef * var) in one docplex call, i.e. `mdl.scal_prod`.
+        Much faster than `mdl.sum(c * v for c, v in ...)`, which creates a temporary expression per term.
+        The var_series and coef_series are aligned by position, not by index.
+        The coefficients can be a Series, a numpy array (e.g. from `prepare_coefs`) or a list.
+
+        Usage:
+            expr = OptimizationEngine.scal_prod_s(mdl, df.xDVar, df.cost)
+        """
+        # Plain lists are the fastest input for docplex (faster than numpy arrays)
+        coefs = coef_series.tolist() if hasattr(coef_series, 'tolist') else list(coef_series)
+        return mdl.scal_prod(var_series.tolist(), coefs)
+
+    def scal_prod(self, var_series: pd.Series, coef_series: Union[pd.Series, np.ndarray, Sequence]):
+        """Returns the linear expression sum(coef * var). See `scal_prod_s`."""
+        return OptimizationEngine.scal_prod_s(self.mdl, var_series, coef_series)
+
+    @staticmethod
+    def prepare_coefs(weights, matrix) -> np.ndarray:
+        """Returns the coefficients weights[i] * matrix[i, j] as a contiguous 1-D float64 array, in row-major order.
+        Intended to prepare the coefficients of a `scal_prod` over an index cross-product (i, j),
+        instead of computing them in a Python loop.
+        If numba is installed, large matrices (at least `OptimizationEngine.numba_min_coefs` values) are computed
+        with a JIT-compiled parallel kernel. Otherwise numpy broadcasting is used.
+
+        Usage:
+            # df has a (driver, location) index sorted in the same (row-major) order as dis_mat
+            coefs = OptimizationEngine.prepare_coefs(driver_weight, dis_mat)
+            expr = mdl.scal_prod(df['xDVar'].tolist(), coefs)
+
+        Args:
+            weights: 1-D array-like with one weight per row of the matrix
+            matrix: 2-D array-like
+        """
+        w = np.ascontiguousarray(weights, dtype=np.float64)
+        m = np.ascontiguousarray(matrix, dtype=np.float64)
+        if m.ndim != 2 or w.shape != (m.shape[0],):
+            raise ValueError(f"Expecting a 2-D matrix and one weight per row. Got weights {w.shape} and matrix {m.shape}")
+        if m.size >= OptimizationEngine.numba_min_coefs:
+            prep_scal_coefs_nb = _get_prep_scal_coefs_nb()
+            if prep_scal_coefs_nb:
+                out = np.empty(m.size, dtype=np.float64)
+                prep_scal_coefs_nb(w, m, out)
+                return out
+        return (w[:, np.newaxis] * m).ravel()
+
+    @staticmethod
+    def sum_vars_s(mdl: docplex.mp.model, var_series: pd.Series):
+        """Returns the sum of the dvars in the series in one docplex call, i.e. `mdl.sum_vars`.
+        Faster than `mdl.sum(df.xDVar)`, since `sum_vars` skips the checks for general expressions."""
+        return mdl.sum_vars(var_series.tolist())
+
+    def sum_vars(self, var_series: pd.Series):
+        """Returns the sum of the dvars in the series. See `sum_vars_s`."""
+        return OptimizationEngine.sum_vars_s(self.mdl, var_series)
+
+    @staticmethod
+    def groupby_scal_prod_s(mdl: docplex.mp.model, df: pd.DataFrame, keys, var_column: str, coef_column: str) -> pd.Series:
+        """Returns a Series with per group the linear expression sum(coef * var). Index is based on the groupby keys.
+
+        Usage:
+            df2 = OptimizationEngine.groupby_scal_prod_s(mdl, df1, ['a'], 'xDVar', 'volume').to_frame(name='expr')
+
+        Instead of a `groupby().apply()`, which creates a DataFrame per group, sorts the row positions by group
+        once and splits the dvar and coefficient arrays into the groups.
+        """
+        grouped = df.groupby(keys, observed=True)  # Only the groups present, also for categorical keys
+        index = grouped.size().index  # In the order of the group numbers
+        codes = grouped.ngroup().to_numpy()
+        positions = np.flatnonzero(codes >= 0)  # Excludes the rows with a NaN key, which are not in any group
+        if len(positions) == 0:
+            return pd.Series([], index=index, dtype=object)
+        positions = positions[np.argsort(codes[positions], kind='stable')]
+        bounds = np.flatnonzero(np.diff(codes[positions])) + 1
+        var_groups = np.split(df[var_column].to_numpy()[positions], bounds)
+        coef_groups = np.split(df[coef_column].to_numpy()[positions], bounds)
+        exprs = [mdl.scal_prod(dvars.tolist(), coefs.tolist()) for dvars, coefs in zip(var_groups, coef_groups)]
+        return pd.Series(exprs, index=index, dtype=object)
+
+    def groupby_scal_prod(self, df: pd.DataFrame, keys, var_column: str, coef_column: str) -> pd.Series:
+        """Returns a Series with per group the linear expression sum(coef * var). See `groupby_scal_prod_s`."""
+        return OptimizationEngine.groupby_scal_prod_s(self.mdl, df, keys, var_column, coef_column)
 
     def semicontinuous_var_series(self, df, lb, **kargs) -> pd.Series:
         """Returns pd.Series[SemiContinuousVarType]"""
@@ -112,7 +380,7 @@ class OptimizationEngine(Generic[DM]):
     @staticmethod
     def semicontinuous_var_series_s(mdl: docplex.mp.model, df: pd.DataFrame, lb, **kargs) -> pd.Series:
         """Returns pd.Series[SemiContinuousVarType]."""
-        return pd.Series(mdl.semicontinuous_var_list(df.index, lb, **kargs), index=df.index, dtype='object')
+        return OptimizationEngine._object_series(mdl.semicontinuous_var_list(df.index, lb, **kargs), df.index)
 
     def semiinteger_var_series(self, df, lb, **kargs) -> pd.Series:
         """Returns pd.Series[SemiIntegerVarType]"""
@@ -121,21 +389,53 @@ class OptimizationEngine(Generic[DM]):
     @staticmethod
     def semiinteger_var_series_s(mdl: docplex.mp.model, df: pd.DataFrame, lb, **kargs) -> pd.Series:
         """Returns pd.Series[SemiIntegerVarType]."""
-        return pd.Series(mdl.semiinteger_var_list(df.index, lb, **kargs), index=df.index, dtype='object')
+        return OptimizationEngine._object_series(mdl.semiinteger_var_list(df.index, lb, **kargs), df.index)
 
-    def solve(self, refine_conflict: Optional[bool] = False, **kwargs) -> docplex.mp.solution.SolveSolution:
+    def solve(self, refine_conflict: Optional[bool] = False, threads: Optional[Union[int, str]] = None, verbose: int = 2,
+              warm_start_from=None, print_solution: Optional[bool] = None, **kwargs) -> docplex.mp.solution.SolveSolution:
+        """Solves the model and prints the solution.
+
+        Args:
+            refine_conflict (bool): If True and no solution is found, run the ConflictRefiner and print the conflicts.
+            threads (int or 'auto'): Number of threads. Sets the CPLEX `parameters.threads` (CPX_PARAM_THREADS), or the
+                `Workers` parameter for a CP Optimizer model. If 'auto', uses the number of CPUs available to this process.
+                Useful in containers, where the CPLEX default (0 = automatic) may detect fewer cores than available.
+                If None, leaves the parameter unchanged.
+            verbose (int): 0: no output after the solve. 1: print the one-line status and the model report.
+                2 (default): also print the full solution, subject to print_solution.
+            print_solution (bool): If the full solution is printed (at verbose 2). If None, only for models with fewer than
+                `OptimizationEngine.print_solution_max_vars` variables, since printing a large solution can take considerable time.
+            warm_start_from (SolveSolution, str or bool): Warm-start the solve. See `add_warm_start`.
+            **kwargs: Passed to mdl.solve()
+        """
+        if threads is not None:
+            self.set_threads(threads, kwargs)
+        if warm_start_from is not None and warm_start_from is not False:
+            self.add_warm_start(warm_start_from)
         # TODO: enable export_as_lp_path()?
         # self.export_as_lp_path(lp_file_name=self.mdl.name)
         # TODO: use self.solve_kwargs if **kwargs is empty/None. Or merge them?
         msol = self.mdl.solve(**kwargs)  # log_output=True
         if msol is not None:
-            print('Found a solution')
-            self.mdl.report()
-            self.mdl.print_solution()
+            self._last_solution = msol
+            if verbose >= 1:
+                print('Found a solution')
+                if not self.is_cpo_model:
+                    self.mdl.report()
+            if verbose >= 2:
+                if print_solution is None:
+                    print_solution = self.get_number_of_variables() < OptimizationEngine.print_solution_max_vars
+                if print_solution:
+                    if self.is_cpo_model:
+                        msol.print_solution()
+                    else:
+                        self.mdl.print_solution()
         else:
-            print('No solution')
+            if verbose >= 1:
+                print('No solution')
             if refine_conflict:
                 print('Conflict Refiner:')
+                from docplex.mp.conflict_refiner import ConflictRefiner
                 crefiner = ConflictRefiner()  # Create an instance of the ConflictRefiner
                 conflicts = crefiner.refine_conflict(self.mdl)  # Run the conflict refiner
                 # ConflictRefiner.display_conflicts(conflicts) #Display the results
@@ -144,12 +444,114 @@ class OptimizationEngine(Generic[DM]):
                         c.element)  # Display conflict result in a little more compact format than ConflictRefiner.display_conflicts
         return msol
 
+    def get_number_of_variables(self) -> int:
+        """Returns the number of variables in the model (CPLEX or CP Optimizer)."""
+        if self.is_cpo_model:
+            return len(self.mdl.get_all_variables())
+        return self.mdl.number_of_variables
+
+    def add_warm_start(self, warm_start_from) -> None:
+        """Warm-starts the next solve of the (CPLEX) model, e.g. in a scenario sweep or rolling horizon.
+
+        Args:
+            warm_start_from: One of:
+                - SolveSolution: added as MIP start. The values are matched by variable name if the solution
+                  is from another model, e.g. from an earlier iteration that rebuilt the model.
+                - True: use the solution of the last successful `solve()` of this engine, if any.
+                - str: path to a CPLEX basis (.bas) file, e.g. written with `write_basis`. Only for LPs.
+        """
+        if warm_start_from is True:
+            warm_start_from = self._last_solution
+            if warm_start_from is None:
+                return
+        if isinstance(warm_start_from, (str, pathlib.Path)):
+            self.mdl.cplex.start.read_basis(os.fspath(warm_start_from))
+            return
+        mdl = self.mdl
+        var_values = {}
+        for var, value in warm_start_from.iter_var_values():
+            if var.model is not mdl:
+                var = mdl.get_var_by_name(var.name) if var.name is not None else None
+                if var is None:  # Not in this model
+                    continue
+            var_values[var] = value
+        mdl.add_mip_start(mdl.new_solution(var_values))
+
+    def write_basis(self, path: str) -> str:
+        """Writes the basis of the last solve of the (CPLEX) LP to a .bas file, for a warm start with `solve(warm_start_from=path)`.
+        Requires the CPLEX runtime.
+
+        Returns:
+            path
+        """
+        self.mdl.cplex.solution.basis.write(path)
+        return path
+
+    def set_threads(self, threads: Union[int, str], solve_kwargs: Optional[Dict] = None) -> int:
+        """Sets the number of threads of the model. See `solve()`.
+        Note that in current CPLEX versions, `parameters.threads` applies to barrier, simplex and MIP alike;
+        the separate BarThreads/MipTasks parameters no longer exist in the docplex parameter tree.
+
+        Args:
+            threads (int or 'auto'): Number of threads. 'auto' uses the number of CPUs available to this process.
+            solve_kwargs (dict): For a CP Optimizer model, the `Workers` parameter is set in these solve kwargs.
+        Returns:
+            number of threads
+        """
+        if threads == 'auto':
+            try:
+                threads = len(os.sched_getaffinity(0))  # Respects CPU affinity, e.g. in containers
+            except AttributeError:  # Not available on Windows and macOS
+                threads = os.cpu_count() or 1
+        if self.is_cpo_model:
+            if solve_kwargs is not None:
+                solve_kwargs['Workers'] = threads
+        else:
+            self.mdl.parameters.threads = threads
+        return threads
+
+    @staticmethod
+    def solve_batch(builders: List[Callable[[], 'OptimizationEngine']], solve_kwargs: Optional[Dict] = None,
+                    max_workers: Optional[int] = None) -> List[Tuple[Optional[float], Optional[pd.DataFrame]]]:
+        """Builds and solves independent (CPLEX) models in parallel, each in its own process.
+        A process per model avoids the GIL in the Python parts of model build and post-processing.
+        Consider limiting the CPLEX threads per model, e.g. `solve_kwargs=dict(threads=1)`, to avoid over-subscription.
+
+        Usage:
+            def build_scenario_1() -> OptimizationEngine:  # Must be a module-level function, i.e. picklable
+                ...
+            results = OptimizationEngine.solve_batch([build_scenario_1, build_scenario_2], solve_kwargs=dict(verbose=0))
+
+        Args:
+            builders (List[Callable]): Picklable functions that each return a new OptimizationEngine with a built model.
+            solve_kwargs (Dict): Passed to `OptimizationEngine.solve()` in each process.
+            max_workers (int): Maximum number of processes. If None, the number of CPUs.
+        Returns:
+            List of (objective value, KPI table), in the order of the builders. (None, None) if no solution was found.
+        """
+        solve_kwargs = {} if solve_kwargs is None else solve_kwargs
+        # Use 'spawn': each process builds its own Model, and forking a process with a loaded CPLEX runtime is not safe.
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = [executor.submit(_build_and_solve, builder, solve_kwargs) for builder in builders]
+            return [future.result() for future in futures]
+
     def get_kpi_output_table(self) -> pd.DataFrame:
-        all_kpis = [(kp.name, kp.compute()) for kp in self.mdl.iter_kpis()]
-        df_kpis = pd.DataFrame(all_kpis, columns=['NAME', 'VALUE'])
-        return df_kpis
+        """Returns a DataFrame with the NAME and VALUE of the KPIs of the model, computed on the current solution.
+        The KPI values are cached for the current solution and KPI objects, so repeated calls don't re-compute the KPIs.
+        """
+        kpis = tuple(self.mdl.iter_kpis())
+        solution = getattr(self.mdl, 'solution', None)
+        cached = self._kpi_cache
+        if (solution is not None and cached is not None and cached[0] is solution
+                and len(cached[1]) == len(kpis) and all(a is b for a, b in zip(cached[1], kpis))):
+            values = cached[2]
+        else:
+            values = [kp.compute() for kp in kpis]
+            if solution is not None:
+                self._kpi_cache = (solution, kpis, values)
+        return pd.DataFrame({'NAME': [kp.name for kp in kpis], 'VALUE': values})
 
-    def export_as_lp(self, local_root: Optional[str] = None, copy_to_csv: bool = False) -> str:
+    def export_as_lp(self, local_root: Optional[str] = None, copy_to_csv: bool = False, async_write: bool = False) -> Union[str, Future]:
         """Export .lp file of model in the 'DSX_PROJECT_DIR.datasets' folder.
         Convenience method.
         It can write a copy as a .csv file, so it can be exported to a local machine.
@@ -159,12 +561,13 @@ class OptimizationEngine(Generic[DM]):
         Args:
             local_root (str): name of local directory. Will write .lp file here, if not in DSX
             copy_to_csv (bool): DEPRECATED. If true, will create a copy of the file with the extension `.csv`.
+            async_write (bool): If true, write the file in a background thread and return a Future. See `export_as_lp_s`.
         Returns:
-            path (str) path to lp file
+            path (str) path to lp file, or a Future with the path if async_write
         Raises:
             ValueError if root directory can't be established.
         """
-        return OptimizationEngine.export_as_lp_s(self.mdl, local_root=local_root, copy_to_csv=copy_to_csv)
+        return OptimizationEngine.export_as_lp_s(self.mdl, local_root=local_root, copy_to_csv=copy_to_csv, async_write=async_write)
 
     def export_as_lp_path(self, lp_file_name: str = 'my_lp_file') -> str:
         """Saves .lp file in self.export_lp_path
@@ -173,7 +576,7 @@ class OptimizationEngine(Generic[DM]):
         """
         filepath = None
         if self.export_lp:
-            if pathlib.Path(lp_file_name).suffix != '.lp':
+            if not lp_file_name.endswith('.lp'):
                 lp_file_name = lp_file_name + '.lp'
             filepath = os.path.join(self.export_lp_path, lp_file_name)
             # TODO: add logger
@@ -181,7 +584,7 @@ class OptimizationEngine(Generic[DM]):
             self.mdl.export_as_lp(filepath)
         return filepath
 
-    def export_as_cpo(self, local_root: Optional[str] = None, copy_to_csv: bool = False):
+    def export_as_cpo(self, local_root: Optional[str] = None, copy_to_csv: bool = False, async_write: bool = False):
         """Export .cpo file of model in the 'DSX_PROJECT_DIR.datasets' folder.
         It can write a copy as a .csv file, so it can be exported to a local machine.
         If not in DSX, it will write to the local file system in the 'local_root/datasets' directory.
@@ -191,15 +594,17 @@ class OptimizationEngine(Generic[DM]):
         Args:
             local_root (str): name of local directory. Will write .lp file here, if not in DSX
             copy_to_csv (bool):  DEPRECATED. If true, will create a copy of the file with the extension `.csv`.
+            async_write (bool): If true, write the file in a background thread and return a Future. See `export_as_cpo_s`.
         Returns:
-            path (str) path to cpo file
+            path (str) path to cpo file, or a Future with the path if async_write
         Raises:
             ValueError if root directory can't be established.
         """
-        return OptimizationEngine.export_as_cpo_s(self.mdl, local_root=local_root, copy_to_csv=copy_to_csv)
+        return OptimizationEngine.export_as_cpo_s(self.mdl, local_root=local_root, copy_to_csv=copy_to_csv, async_write=async_write)
 
     @staticmethod
-    def export_as_lp_s(model, model_name: Optional[str] = None, local_root: Optional[str] = None, copy_to_csv: bool = False) -> str:
+    def export_as_lp_s(model, model_name: Optional[str] = None, local_root: Optional[str] = None, copy_to_csv: bool = False,
+                       async_write: bool = False) -> Union[str, Future]:
         """Export .lp file of model in the 'DSX_PROJECT_DIR.datasets' folder.
         It can write a copy as a .csv file, so it can be exported to a local machine.
         If not in WSL, it will write to the local file system in the 'local_root/datasets' directory.
@@ -210,8 +615,11 @@ class OptimizationEngine(Generic[DM]):
                 Specify if the model.name is not a valid file-name.
             local_root (str): name of local directory. Will write .lp file here, if not in WSL
             copy_to_csv (bool): DEPRECATED. If true, will create a copy of the file with the extension `.csv`.
+            async_write (bool): If true, write the file (and add it as data asset) in a background thread.
+                Returns a Future that resolves to the path. Call `.result()` to wait for it and to raise any error.
+                Do not modify the model until the write is done.
         Returns:
-            path (str) path to lp file
+            path (str) path to lp file, or a Future with the path if async_write
         Raises:
             ValueError if root directory can't be established.
         """
@@ -219,15 +627,20 @@ class OptimizationEngine(Generic[DM]):
         if model_name is None:
             model_name = model.name
         # Get root directory:
-        sm = ScenarioManager(local_root=local_root)  # Just to call the get_root_directory()
-        # root_dir = sm.get_root_directory()
-        datasets_dir = sm.get_data_directory()
+        datasets_dir = os.fspath(_get_datasets_dir(local_root))
         # Write regular lp-file:
         # lp_file_name_1 = os.path.join(root_dir, 'datasets', model_name + '.lp')
-        lp_file_name_1 = os.path.join(datasets_dir, model_name + '.lp')
-        model.export_as_lp(lp_file_name_1)  # Writes the .lp file
+        lp_file_name_1 = f"{datasets_dir}{_SEP}{model_name}.lp"
+
+        def write_lp() -> str:
+            model.export_as_lp(lp_file_name_1)  # Writes the .lp file
+            # Pass the cached platform, so it is not detected again. Does nothing on the Local platform.
+            _get_scenario_manager_class().add_file_as_data_asset_s(lp_file_name_1, model_name + '.lp', platform=_get_platform())
+            return lp_file_name_1
 
-        ScenarioManager.add_file_as_data_asset_s(lp_file_name_1, model_name + '.lp')
+        if async_write:
+            return _export_pool.submit(write_lp)
+        write_lp()
 
         # platform = ScenarioManager.detect_platform()
         # if platform == platform.CPD40:
@@ -246,7 +659,8 @@ class OptimizationEngine(Generic[DM]):
         return lp_file_name_1
 
     @staticmethod
-    def export_as_cpo_s(model, model_name: Optional[str] = None, local_root: Optional[str] = None, copy_to_csv: bool = False, **kwargs) -> str:
+    def export_as_cpo_s(model, model_name: Optional[str] = None, local_root: Optional[str] = None, copy_to_csv: bool = False,
+                        async_write: bool = False, **kwargs) -> Union[str, Future]:
         """Export .cpo file of model in the 'DSX_PROJECT_DIR.datasets' folder.
         It can write a copy as a .csv file, so it can be exported to a local machine.
         If not in DSX, it will write to the local file system in the 'local_root/datasets' directory.
@@ -257,9 +671,11 @@ class OptimizationEngine(Generic[DM]):
                 Specify if the model.name is not a valid file-name.
             local_root (str): name of local directory. Will write .lp file here, if not in DSX
             copy_to_csv (bool): If true, will create a copy of the file with the extension `.csv`.
+            async_write (bool): If true, write the file(s) in a background thread and return a Future that resolves to the path.
+                Do not modify the model until the write is done.
             **kwargs: Passed to model.export_model
         Returns:
-            path (str) path to cpo file
+            path (str) path to cpo file, or a Future with the path if async_write
         Raises:
             ValueError if root directory can't be established.
         """
@@ -267,28 +683,32 @@ class OptimizationEngine(Generic[DM]):
         if model_name is None:
             model_name = model.name
         # Get root directory:
-        sm = ScenarioManager(local_root=local_root)  # Just to call the get_root_directory()
-        # root_dir = sm.get_root_directory()
-        datasets_dir = sm.get_data_directory()
+        datasets_dir = os.fspath(_get_datasets_dir(local_root))
         # Write regular cpo-file:
-        cpo_file_name_1 = os.path.join(datasets_dir, model_name + '.cpo')
-        model.export_model(cpo_file_name_1)  # Writes the .cpo file
-        # Copy to csv
-        if copy_to_csv:
-            cpo_file_name_2 = os.path.join(datasets_dir, model_name + '_to_csv.cpo')
-            csv_file_name_2 = os.path.join(datasets_dir, model_name + '_cpo.csv')
-            model.export_as_lp(cpo_file_name_2)
-            os.rename(cpo_file_name_2, csv_file_name_2)
+        cpo_file_name_1 = f"{datasets_dir}{_SEP}{model_name}.cpo"
+
+        def write_cpo() -> str:
+            model.export_model(cpo_file_name_1)  # Writes the .cpo file
+            # Copy to csv: copy the file instead of exporting the model a second time
+            if copy_to_csv:
+                csv_file_name_2 = f"{datasets_dir}{_SEP}{model_name}_cpo.csv"
+                shutil.copyfile(cpo_file_name_1, csv_file_name_2)
+            return cpo_file_name_1
+
+        if async_write:
+            return _export_pool.submit(write_cpo)
         # Return
-        return cpo_file_name_1
+        return write_cpo()
 
     def add_mip_progress_kpis(self, mip_gap_kpi_name="Gap", solve_time_kpi_name="Solve Time",
                               best_bound_kpi_name="Best Bound", solution_count_kpi_name="Solution Count",
                               solve_phase_kpi_name="Solve Phase"):
         """Adds 5 KPIs to the self.mdl: 'Gap', 'Solve Time', 'Best Bound', 'Solution Count', 'Solve Phase'.
+        The values are refreshed together, once per progress notification, by a single MyProgressListener.
+        The KPIs only read the latest values from the listener.
 
         Args:
-            mip_gap_kpi_name (str):
+            mip_gap_kpi_name (str): If None, the KPI is not added. Same for the other KPI names.
             solve_time_kpi_name (str):
             best_bound_kpi_name (str):
             solution_count_kpi_name (str):
@@ -300,16 +720,12 @@ class OptimizationEngine(Generic[DM]):
         mdl = self.mdl
         mdl.progress_listener = MyProgressListener(mdl)
         mdl.add_progress_listener(mdl.progress_listener)
-        if mip_gap_kpi_name is not None:
-            mdl.add_kpi(lambda mdl, sol: mdl.progress_listener.mip_gap, mip_gap_kpi_name)
-        if solve_time_kpi_name is not None:
-            mdl.add_kpi(lambda mdl, sol: mdl.progress_listener.solve_time, solve_time_kpi_name)
-        if best_bound_kpi_name is not None:
-            mdl.add_kpi(lambda mdl, sol: mdl.progress_listener.best_bound, best_bound_kpi_name)
-        if solution_count_kpi_name is not None:
-            mdl.add_kpi(lambda mdl, sol: mdl.progress_listener.solution_count, solution_count_kpi_name)
-        if solve_phase_kpi_name is not None:
-            mdl.add_kpi(lambda mdl, sol: mdl.progress_listener.solve_phase, solve_phase_kpi_name)
+        # Bind the listener and attribute getter once, so each KPI evaluation is a single attribute fetch
+        kpis = [(mip_gap_kpi_name, 'mip_gap'), (solve_time_kpi_name, 'solve_time'), (best_bound_kpi_name, 'best_bound'),
+                (solution_count_kpi_name, 'solution_count'), (solve_phase_kpi_name, 'solve_phase')]
+        for kpi_name, attribute in kpis:
+            if kpi_name is not None:
+                mdl.add_kpi(lambda m, s, _pl=mdl.progress_listener, _get=operator.attrgetter(attribute): _get(_pl), kpi_name)
 
     ####################################################
     #  CP Optimizer methods
@@ -320,7 +736,7 @@ class OptimizationEngine(Generic[DM]):
         For **kargs, see docplex.cp.expression.interval_var_list (http://ibmdecisionoptimization.github.io/docplex-doc/cp/docplex.cp.expression.py.html?highlight=interval_var_list#docplex.cp.expression.interval_var_list)"""
         interval_list = cp.interval_var_list(df.shape[0], **kwargs)
         #     mdl.add(interval_list)  # Optional: you don't need to add variables to the model. Variables that appear in expressions are automatically added to the model
-        interval_series = pd.Series(interval_list, index=df.index)
+        interval_series = OptimizationEngine._object_series(interval_list, df.index)
         return interval_series
 
     def cp_interval_var_series(self, df, **kargs) -> pd.Series:
@@ -333,7 +749,7 @@ class OptimizationEngine(Generic[DM]):
         For **kwargs, see docplex.cp.expression.integer_var_list (http://ibmdecisionoptimization.github.io/docplex-doc/cp/docplex.cp.expression.py.html#docplex.cp.expression.integer_var_list)"""
         integer_list = cp.integer_var_list(df.shape[0], **kwargs)
         #     mdl.add(integer_list)  # Optional: you don't need to add variables to the model. Variables that appear in expressions are automatically added to the model
-        integer_series = pd.Series(integer_list, index=df.index)
+        integer_series = OptimizationEngine._object_series(integer_list, df.index)
         return integer_series
 
     @staticmethod
@@ -344,14 +760,13 @@ class OptimizationEngine(Generic[DM]):
         If multi-index df, keys are separated by '_', e.g. 'xDvar_1_2_3'
         """
 
-        if name is None:
-            integer_list = mdl.integer_var_list(df.shape[0], min, max, name, domain)
-        else:
-            integer_list = []
-            for ix in df.index:
-                new_name = f"{name}_{OptimizationEngine._get_index_as_str(ix)}"
-                integer_list.append(mdl.integer_var(min, max, new_name, domain))
-        integer_series = pd.Series(integer_list, index=df.index)
+        # Create the vars in one call, so the domain is validated once, then name them
+        integer_list = mdl.integer_var_list(df.shape[0], min, max, None, domain)
+        if name is not None:
+            get_index_as_str = OptimizationEngine._get_index_as_str
+            for var, ix in zip(integer_list, df.index):
+                var.set_name(f"{name}_{get_index_as_str(ix)}")
+        integer_series = OptimizationEngine._object_series(integer_list, df.index)
         return integer_series
 
     @staticmethod
@@ -380,7 +795,7 @@ class OptimizationEngine(Generic[DM]):
         For **kargs, see docplex.cp.expression.integer_var_list (http://ibmdecisionoptimization.github.io/docplex-doc/cp/docplex.cp.expression.py.html#docplex.cp.expression.binary_var_list)"""
         integer_list = cp.binary_var_list(df.shape[0], **kwargs)
         #     mdl.add(integer_list)  # Optional: you don't need to add variables to the model. Variables that appear in expressions are automatically added to the model
-        integer_series = pd.Series(integer_list, index=df.index)
+        integer_series = OptimizationEngine._object_series(integer_list, df.index)
         return integer_series
 
     def cp_binary_var_series(self, df, **kwargs) -> pd.Series:
@@ -394,6 +809,10 @@ class OptimizationEngine(Generic[DM]):
 
 
 class MyProgressListener(SolutionListener):
+    # Slots for the attributes written on each progress notification. The SolutionListener base class has a __dict__,
+    # so other attributes can still be set.
+    __slots__ = ('solution_count', 'mip_gap', 'best_bound', 'solve_time', 'solve_phase', 'my_model', '_get_progress_fields')
+
     def __init__(self, mdl: docplex.mp.model):
         SolutionListener.__init__(self, mdl)
         self.solution_count = 0
@@ -402,15 +821,12 @@ class MyProgressListener(SolutionListener):
         self.solve_time = 0
         self.solve_phase = 0
         self.my_model = mdl
+        self._get_progress_fields = operator.attrgetter('best_bound', 'mip_gap', 'time')
 
     def notify_progress(self, progress_data):
         self.solution_count += 1
-        self.best_bound = progress_data.best_bound
-        self.mip_gap = progress_data.mip_gap
-        self.solve_time = progress_data.time
-        try:
-            self.solve_phase = self.my_model.solve_phase
-        except AttributeError:
-            pass
+        self.best_bound, self.mip_gap, self.solve_time = self._get_progress_fields(progress_data)
+        # The model may get a solve_phase attribute after this listener was created, so look it up on each call:
+        self.solve_phase = getattr(self.my_model, 'solve_phase', self.solve_phase)
         # self.my_model.outputs = self.post_process()
 
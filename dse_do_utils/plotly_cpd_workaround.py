@@ -3,7 +3,6 @@
 
 import plotly
 import plotly.graph_objs as go
-from IPython.display import display, HTML
 
 
 def _show(self):
@@ -13,6 +12,7 @@ def _show(self):
         2. Create a go.Figure fig in the normal Plotly way. Then in the last line of the cell, instead of `fig.show()`, do a:
         3. `fig._show()`
     """
+    from IPython.display import display, HTML  # Import on first use, i.e. only when running in Jupyter
     html = plotly.io.to_html(self)
     display(HTML(html))
 
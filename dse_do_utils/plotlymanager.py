@@ -2,6 +2,7 @@
 # SPDX-License-Identifier: Apache-2.0
 from typing import Generic, TypeVar, Optional, Dict
 
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objs as go
@@ -29,6 +30,10 @@ class PlotlyManager(Generic[DM]):
     """Holds method that create Plotly charts.
     Pass-in the DM as an input in the constructor.
     """
+    # Slots for all attributes, so instances don't have a __dict__. '__weakref__' is included to allow weak references.
+    # Subclasses without __slots__ do get a __dict__, so they can still add their own attributes.
+    __slots__ = ('dm', 'ref_dm', 'ms_inputs', 'ms_outputs', '_ms_table_cache', '__weakref__')
+
     def __init__(self, dm: DM):
         self.dm: DM = dm
 
@@ -40,6 +45,8 @@ class PlotlyManager(Generic[DM]):
         # One 'multi-scenario' df contains data for the same scenario table from multiple scenarios
         self.ms_inputs: Dict[str, pd.DataFrame] = None  # Dict[TableName, 'multi-scenario' dataframe]
         self.ms_outputs: Dict[str, pd.DataFrame] = None  # Dict[TableName, 'multi-scenario' dataframe]
+        # Cache of get_multi_scenario_table: Dict[TableName, (source df, Scenario df, merged df)]
+        self._ms_table_cache: Dict[str, tuple] = {}
 
     def get_plotly_fig_m(self, id):
         """DEPRECATED. Not used in dse_do_dashboard package.
@@ -59,7 +66,7 @@ class PlotlyManager(Generic[DM]):
     ###################################################################
     #  For scenario-compare in dse-do-dashboard
     ###################################################################
-    def plotly_kpi_compare_bar_charts(self, figs_per_row: int = 3, orientation: str = 'v') -> [[go.Figure]]:
+    def plotly_kpi_compare_bar_charts(self, figs_per_row: int = 3, orientation: str = 'v', faceted: bool = False) -> [[go.Figure]]:
         """
         Generalized compare of KPIs between scenarios. Creates a list-of-list of go.Figure, i.e. rows of figures,
         for the PlotlyRowsVisualizationPage.
@@ -73,6 +80,8 @@ class PlotlyManager(Generic[DM]):
         Args:
             figs_per_row: int - Maximum number of figures per row
             orientation: str - `h' (horizontal) or `v` (vertical)
+            faceted: bool - If True, create one faceted figure with a sub-plot per KPI, returned as `[[fig]]`.
+                Much faster with many KPIs than creating a figure per KPI.
 
         Returns:
             figures in rows ([[go.Figure]]) - bar-charts in rows
@@ -82,16 +91,18 @@ class PlotlyManager(Generic[DM]):
         if self.get_multi_scenario_compare_selected():
             df = self.get_multi_scenario_table('kpis')
         elif self.get_reference_scenario_compare_selected():
-            ref_df = self.ref_dm.kpis.reset_index()
-            ref_df['scenario_name'] = 'Reference'
             selected_df = self.dm.kpis.reset_index()
-            selected_df['scenario_name'] = 'Current'
-            df = pd.concat([selected_df, ref_df])
+            ref_df = self.ref_dm.kpis.reset_index()
+            df = pd.concat([selected_df, ref_df], ignore_index=True)
+            df['scenario_name'] = np.repeat(['Current', 'Reference'], [len(selected_df), len(ref_df)])
         else:
             df = self.dm.kpis.reset_index()
             df['scenario_name'] = 'Current'
 
-        for kpi_name, group in df.groupby('NAME'):
+        if faceted:
+            return [[self._plotly_kpi_compare_faceted_bar_chart(df, figs_per_row, orientation)]]
+
+        for kpi_name, group in df.groupby('NAME', observed=True):
             labels = {'scenario_name': 'Scenario', 'VALUE': kpi_name}
             title = f'{kpi_name}'
             if orientation == 'v':
@@ -110,16 +121,51 @@ class PlotlyManager(Generic[DM]):
         figs = [figs[i:i + n] for i in range(0, len(figs), n)]
         return figs
 
+    @staticmethod
+    def _plotly_kpi_compare_faceted_bar_chart(df: pd.DataFrame, figs_per_row: int = 3, orientation: str = 'v') -> go.Figure:
+        """Single faceted bar-chart with a sub-plot per KPI. See `plotly_kpi_compare_bar_charts`."""
+        labels = {'scenario_name': 'Scenario', 'VALUE': 'Value'}
+        category_orders = {'NAME': sorted(df['NAME'].unique())}
+        if orientation == 'v':
+            fig = px.bar(df, x='scenario_name', y='VALUE', orientation='v', color='scenario_name', facet_col='NAME',
+                         facet_col_wrap=figs_per_row, category_orders=category_orders, labels=labels)
+            fig.update_yaxes(matches=None, showticklabels=True)  # KPIs have different scales
+        else:
+            fig = px.bar(df, y='scenario_name', x='VALUE', orientation='h', color='scenario_name', facet_col='NAME',
+                         facet_col_wrap=figs_per_row, category_orders=category_orders, labels=labels)
+            fig.update_xaxes(matches=None, showticklabels=True)
+        fig.for_each_annotation(lambda a: a.update(text=a.text.split('=', 1)[-1]))  # Strip the 'NAME=' prefix
+        fig.update_xaxes(title=None)
+        fig.update_yaxes(title=None)
+        fig.update_layout(showlegend=False)
+        return fig
+
     def get_multi_scenario_compare_selected(self) -> bool:
         """Returns True if the user has selected multi-scenario compare.
         """
         ms_enabled = (isinstance(self.ms_outputs, dict)
                       and isinstance(self.ms_inputs, dict)
-                      and 'Scenario' in self.ms_inputs.keys()
+                      and 'Scenario' in self.ms_inputs
                       and self.ms_inputs['Scenario'].shape[0] > 0
                       )
         return ms_enabled
 
+    @staticmethod
+    def _merge_scenario_name(df: pd.DataFrame, scenario_df: pd.DataFrame) -> pd.DataFrame:
+        """Merges the Scenario table into the df on the scenario_seq. Requires scenario_seq. Merges-in the scenario_name.
+        If the Scenario table has no other columns and a unique scenario_seq, maps the scenario_name instead of doing a full merge.
+        Same rows as the (inner) merge, i.e. rows without a matching scenario_seq are dropped, but in the row order of df.
+        """
+        if (set(scenario_df.columns) != {'scenario_seq', 'scenario_name'}
+                or not scenario_df['scenario_seq'].is_unique):  # Series.map requires unique keys
+            return df.merge(scenario_df, on='scenario_seq')
+        scenario_names = pd.Series(scenario_df['scenario_name'].to_numpy(), index=scenario_df['scenario_seq'].to_numpy())
+        df = df.assign(scenario_name=df['scenario_seq'].map(scenario_names))
+        matched = df['scenario_seq'].isin(scenario_names.index)
+        if not matched.all():
+            df = df[matched]
+        return df.reset_index(drop=True)
+
     def get_reference_scenario_compare_selected(self) -> bool:
         """Returns True if the user has selected (single) reference-scenario compare
         """
@@ -130,17 +176,28 @@ class PlotlyManager(Generic[DM]):
     def get_multi_scenario_table(self, table_name: str) -> Optional[pd.DataFrame]:
         """Gets the df from the table named `table_name` in either inputs or outputs.
         If necessary (i.e. when using scenario_seq), merges the Scenario table, so it has the scenario_name as column.
+        The merge is cached for as long as the table and the Scenario table are the same DataFrame objects,
+        so repeated calls from dashboard callbacks merge at most once.
+        Replacing a table in `ms_inputs` or `ms_outputs` (or replacing the dicts) invalidates the cache.
+        Modifying a DataFrame in place does not.
         DataFrame is NOT indexed!
         """
-        if table_name in self.ms_inputs.keys():
+        if table_name in self.ms_inputs:
             df = self.ms_inputs[table_name]
-        elif table_name in self.ms_outputs.keys():
+        elif table_name in self.ms_outputs:
             df = self.ms_outputs[table_name]
         else:
             df = None
 
         if df is not None:
             if "scenario_name" not in df.columns:
-                df = df.merge(self.ms_inputs['Scenario'], on='scenario_seq')  # Requires scenario_seq. Merges-in the scenario_name.
+                scenario_df = self.ms_inputs['Scenario']
+                cached = self._ms_table_cache.get(table_name)
+                if cached is not None and cached[0] is df and cached[1] is scenario_df:
+                    merged_df = cached[2]
+                else:
+                    merged_df = PlotlyManager._merge_scenario_name(df, scenario_df)
+                    self._ms_table_cache[table_name] = (df, scenario_df, merged_df)
+                df = merged_df.copy(deep=False)  # Shallow copy, so adding columns doesn't change the cached df
 
         return df
\ No newline at end of file
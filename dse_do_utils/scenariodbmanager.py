@@ -18,14 +18,17 @@
 # - Cleanup, small documentation and typing hints
 # - Make 'multi_scenario' the default option
 # -----------------------------------------------------------------------------------
+import contextlib
+import functools
 import pathlib
+import sqlite3
 import zipfile
 from abc import ABC
-from multiprocessing.pool import ThreadPool
+from concurrent.futures import ThreadPoolExecutor
 
 import sqlalchemy
 import pandas as pd
-from typing import Dict, List, NamedTuple, Any, Optional
+from typing import Dict, List, NamedTuple, Any, Optional, Tuple, Callable
 from collections import OrderedDict
 import re
 from sqlalchemy import exc, MetaData
@@ -38,6 +41,8 @@ from dse_do_utils import ScenarioManager
 Inputs = Dict[str, pd.DataFrame]
 Outputs = Dict[str, pd.DataFrame]
 
+_CAMEL_CASE_RE = re.compile(r'(?<!^)(?=[A-Z])')  # Position before each upper-case character, except at the start
+
 
 class DatabaseType(enum.Enum):
     """Used in ScenarioDbManager.__init__ to specify the type of DB it is connecting to."""
@@ -82,6 +87,7 @@ class ScenarioDbTable(ABC):
         if db_table_name in reserved_table_names:
             print(f"Warning: the db_table_name '{db_table_name}' is a reserved word. Do not use as table name.")
         self._sa_column_by_name = None  # Dict[str, sqlalchemy.Column] Will be generated dynamically first time it is needed.
+        self._column_names = None  # Tuple[str] Names of the sqlalchemy.Columns in columns_metadata. See `_get_column_names`
         self._dbm: ScenarioDbManager = None  # To be set from ScenarioDbManager during initialization
 
     @property
@@ -131,16 +137,10 @@ class ScenarioDbTable(ABC):
         :param df:
         :return:
         """
-        column_names = []
-        # columns_metadata = []
-        for c in self.columns_metadata:
-            if isinstance(c, sqlalchemy.Column):
-                if c.name in df.columns:
-                    column_names.append(c.name)
-                    # columns_metadata.append(c)
-                else:
-                    column_names.append(c.name)
-                    df[c.name] = None
+        column_names = list(self._get_column_names())
+        for column_name in column_names:
+            if column_name not in df.columns:
+                df[column_name] = None
 
         return column_names, df
 
@@ -150,11 +150,15 @@ class ScenarioDbTable(ABC):
         :param df:
         :return:
         """
-        column_names = []
-        for c in self.columns_metadata:
-            if isinstance(c, sqlalchemy.Column) and c.name in df.columns:
-                column_names.append(c.name)
-        return column_names
+        return [column_name for column_name in self._get_column_names() if column_name in df.columns]
+
+    def _get_column_names(self) -> Tuple[str, ...]:
+        """Names of all sqlalchemy.Columns in the columns_metadata, in order.
+        Cached on first use. The cache is reset in `create_table_metadata`, which adds the scenario_seq/scenario_name column.
+        """
+        if self._column_names is None:
+            self._column_names = tuple(c.name for c in self.columns_metadata if isinstance(c, sqlalchemy.Column))
+        return self._column_names
 
     def get_sa_table(self) -> Optional[sqlalchemy.Table]:
         """Returns the SQLAlchemy Table. Can be None if table is a AutoScenarioDbTable and not defined in Python code."""
@@ -186,45 +190,50 @@ class ScenarioDbTable(ABC):
 
         if multi_scenario and (self.db_table_name != 'scenario'):
             if self.enable_scenario_seq:
-                columns_metadata.insert(0, Column('scenario_seq', Integer(), ForeignKey("scenario.scenario_seq"),
-                                                  primary_key=True, index=True))
+                scenario_column = Column('scenario_seq', Integer(), ForeignKey("scenario.scenario_seq"),
+                                         primary_key=True, index=True)
                 constraints_metadata = [ScenarioDbTable.add_scenario_seq_to_fk_constraint(fkc) for fkc in
                                     constraints_metadata]
             else:
-                columns_metadata.insert(0, Column('scenario_name', String(256), ForeignKey("scenario.scenario_name"),
-                                                  primary_key=True, index=True))
+                scenario_column = Column('scenario_name', String(256), ForeignKey("scenario.scenario_name"),
+                                         primary_key=True, index=True)
                 constraints_metadata = [ScenarioDbTable.add_scenario_name_to_fk_constraint(fkc) for fkc in
                                         constraints_metadata]
+            # Prepend the scenario column in a new list, instead of an insert(0) in the existing list.
+            # Replaces the scenario column of a previous call, if any, so it is never added twice.
+            columns_metadata = [scenario_column] + [c for c in columns_metadata
+                                                    if not (isinstance(c, Column) and c.name == scenario_column.name)]
+            self.columns_metadata = columns_metadata
 
+        self._column_names = None  # columns_metadata may have changed
         return Table(self.db_table_name, metadata, *(c for c in (columns_metadata + constraints_metadata)))
 
     @staticmethod
     def add_scenario_name_to_fk_constraint(fkc: ForeignKeyConstraint):
         """Creates a new ForeignKeyConstraint by adding the `scenario_name`."""
-        columns = fkc.column_keys
         refcolumns = [fk.target_fullname for fk in fkc.elements]
         table_name = refcolumns[0].split(".")[0]
         # Create a new ForeignKeyConstraint by adding the `scenario_name`
-        columns.insert(0, 'scenario_name')
-        refcolumns.insert(0, f"{table_name}.scenario_name")
+        columns = ['scenario_name'] + fkc.column_keys
+        refcolumns = [f"{table_name}.scenario_name"] + refcolumns
         # TODO: `deferrable=True` doesn't seem to have an effect. Also, deferrable is illegal in DB2!?
         return ForeignKeyConstraint(columns, refcolumns)  #, deferrable=True
 
     @staticmethod
     def add_scenario_seq_to_fk_constraint(fkc: ForeignKeyConstraint):
         """Creates a new ForeignKeyConstraint by adding the `scenario_seq`."""
-        columns = fkc.column_keys
         refcolumns = [fk.target_fullname for fk in fkc.elements]
         table_name = refcolumns[0].split(".")[0]
         # Create a new ForeignKeyConstraint by adding the `scenario_seq`
-        columns.insert(0, 'scenario_seq')
-        refcolumns.insert(0, f"{table_name}.scenario_seq")
+        columns = ['scenario_seq'] + fkc.column_keys
+        refcolumns = [f"{table_name}.scenario_seq"] + refcolumns
         # TODO: `deferrable=True` doesn't seem to have an effect. Also, deferrable is illegal in DB2!?
         return ForeignKeyConstraint(columns, refcolumns)  #, deferrable=True
 
     @staticmethod
+    @functools.lru_cache(maxsize=1024)  # Table and column names are a small set
     def camel_case_to_snake_case(name: str) -> str:
-        return re.sub(r'(?<!^)(?=[A-Z])', '_', name).lower()
+        return _CAMEL_CASE_RE.sub('_', name).lower()
 
     @staticmethod
     def df_column_names_to_snake_case(df: pd.DataFrame) -> pd.DataFrame:
@@ -266,13 +275,65 @@ class ScenarioDbTable(ABC):
         df = self.fixNanNoneNull(df)
 
         try:
-            df.to_sql(table_name, schema=mgr.schema, con=connection, if_exists='append', dtype=None,
-                               index=False)
+            if self._can_insert_sqlite_executemany(df, mgr, connection):
+                self._insert_sqlite_executemany(df, connection)
+            else:
+                df.to_sql(table_name, schema=mgr.schema, con=connection, if_exists='append', dtype=None,
+                                   index=False, **mgr.get_to_sql_kwargs(len(columns)))
         except exc.IntegrityError as e:
             print("++++++++++++Integrity Error+++++++++++++")
             print(f"DataFrame insert/append of table '{table_name}'")
             print(e)
 
+    def _can_insert_sqlite_executemany(self, df: pd.DataFrame, mgr, connection) -> bool:
+        """Returns True if the df can be inserted with `_insert_sqlite_executemany`, i.e. directly with the sqlite3 driver.
+        Requires a SQLite connection (not the engine), no custom insert_method, and the values must be passed to the driver as-is:
+        no SQLAlchemy bind-processing of the column types (e.g. DateTime; Float is fine for numeric columns),
+        no Python-side column defaults and only numeric, boolean or string columns.
+        Bypasses the SQLAlchemy statement logging and cursor execute events. Therefore not used if echo is enabled
+        or if there are cursor execute event listeners.
+        """
+        if (mgr.insert_method is not None or self.table_metadata is None
+                or not isinstance(connection, sqlalchemy.engine.Connection) or connection.dialect.name != 'sqlite'):
+            return False
+        if (mgr.echo or connection.engine.echo
+                or connection.dispatch.before_cursor_execute or connection.dispatch.after_cursor_execute):
+            return False
+        dialect = connection.dialect
+        for c in self.table_metadata.columns:
+            if c.name in df.columns:
+                if isinstance(c.type, sqlalchemy.Float) and pd.api.types.is_numeric_dtype(df[c.name].dtype):
+                    continue  # The Float bind-processor only converts to float
+                if c.type.dialect_impl(dialect).bind_processor(dialect) is not None:
+                    return False
+            elif c.default is not None:
+                return False
+        for column_name, dtype in df.dtypes.items():
+            if dtype == object:
+                if pd.api.types.infer_dtype(df[column_name], skipna=True) not in ('string', 'empty'):
+                    return False
+            elif not (pd.api.types.is_integer_dtype(dtype) or pd.api.types.is_float_dtype(dtype) or pd.api.types.is_bool_dtype(dtype)):
+                return False
+        return True
+
+    def _insert_sqlite_executemany(self, df: pd.DataFrame, connection):
+        """Inserts the df with a single executemany on the sqlite3 (DBAPI) connection, within the transaction of the connection.
+        About 2x faster than the DataFrame.to_sql, which adds the SQLAlchemy overhead for each row.
+        Only use if `_can_insert_sqlite_executemany`.
+        Errors of the sqlite3 driver are raised as SQLAlchemy exceptions (e.g. `exc.IntegrityError`),
+        including the SQL and parameters in the message, as with the `DataFrame.to_sql`.
+        """
+        compiled = self.table_metadata.insert().compile(dialect=connection.dialect, column_keys=list(df.columns))
+        df = df[list(compiled.positiontup)]  # Order of the columns as the '?' parameters in the SQL
+        cursor = connection.connection.cursor()
+        try:
+            cursor.executemany(compiled.string, df.itertuples(index=False, name=None))
+        except sqlite3.Error as e:
+            raise exc.DBAPIError.instance(compiled.string, list(df.itertuples(index=False, name=None)), e,
+                                          sqlite3.Error, dialect=connection.dialect, ismulti=True) from e
+        finally:
+            cursor.close()
+
     @staticmethod
     def fixNanNoneNull(df) -> pd.DataFrame:
         """Ensure that NaN values are converted to None. Which in turn causes the value to be NULL in the DB.
@@ -305,14 +366,16 @@ class ScenarioDbTable(ABC):
                         print(f"Failed to convert column {df_column_name} to {df_type}")
         return df
 
-    def _delete_scenario_table_from_db(self, scenario_name, connection):
+    def _delete_scenario_table_from_db(self, scenario_name, connection, scenario_seqs: Optional[List[int]] = None):
         """Delete all rows associated with the scenario in the DB table.
         Beware: make sure this is done in the right 'inverse cascading' order to avoid FK violations.
+
+        :param scenario_seqs: (optional) the scenario_seqs of the scenario_name. If None, will be queried from the scenario table.
+        Pass when deleting from multiple tables, to avoid repeating the same query for each table.
         """
         if self.enable_scenario_seq:
-            s = self.dbm.get_scenario_sa_table()
-            # scenario_seqs = [seq for seq in connection.execute(s.select(s.c.scenario_seq).where(s.c.scenario_name == scenario_name))]
-            scenario_seqs = [r.scenario_seq for r in connection.execute(s.select().where(s.c.scenario_name == scenario_name))]
+            if scenario_seqs is None:
+                scenario_seqs = self.dbm._get_scenario_seqs(scenario_name, connection)
 
             t = self.get_sa_table()  # A Table()
             if t is not None:
@@ -327,20 +390,18 @@ class ScenarioDbTable(ABC):
 
     @staticmethod
     def sqlcol(df: pd.DataFrame) -> Dict:
-        dtypedict = {}
-        for i, j in zip(df.columns, df.dtypes):
-            if "object" in str(j):
-                dtypedict.update({i: sqlalchemy.types.NVARCHAR(length=255)})
-
-            if "datetime" in str(j):
-                dtypedict.update({i: sqlalchemy.types.DateTime()})
-
-            if "float" in str(j):
-                dtypedict.update({i: sqlalchemy.types.Float()})  # precision=10, asdecimal=True
-
-            if "int" in str(j):
-                dtypedict.update({i: sqlalchemy.types.INT()})
-        return dtypedict
+        """SQLAlchemy column types for the columns of the df, based on the `dtype.kind`.
+        Columns of other kinds (e.g. category) are not included, i.e. use the pandas default."""
+        kind_types = {
+            'O': lambda: sqlalchemy.types.NVARCHAR(length=255),
+            'M': sqlalchemy.types.DateTime,
+            'f': sqlalchemy.types.Float,  # precision=10, asdecimal=True
+            'i': sqlalchemy.types.INT,
+            'u': sqlalchemy.types.INT,
+            'b': sqlalchemy.types.Boolean,
+        }
+        return {column_name: kind_types[dtype.kind]() for column_name, dtype in df.dtypes.items()
+                if dtype.kind in kind_types and not isinstance(dtype, pd.CategoricalDtype)}
 
     @staticmethod
     def extend_columns_constraints(columns: list[Column],
@@ -437,7 +498,8 @@ class AutoScenarioDbTable(ScenarioDbTable):
             # Note that this can use the 'replace', so the table will be dropped automatically and the defintion auto created
             # So no need to drop the table explicitly (?)
             # TODO: review the 'replace': does it need to be 'append', as in the regular class?
-            df.to_sql(table_name, schema=mgr.schema, con=connection, if_exists='replace', dtype=dtype, index=False)
+            df.to_sql(table_name, schema=mgr.schema, con=connection, if_exists='replace', dtype=dtype, index=False,
+                      **mgr.get_to_sql_kwargs(df.shape[1]))
         except exc.IntegrityError as e:
             print("++++++++++++Integrity Error+++++++++++++")
             print(f"DataFrame insert/append of table '{table_name}'")
@@ -496,6 +558,10 @@ class ScenarioDbManager():
                  db_type: DatabaseType = DatabaseType.SQLite,
                  use_custom_naming_convention: bool = False,
                  future: bool = True,
+                 insert_method: Optional[str] = None,
+                 insert_chunksize: Optional[int] = None,
+                 engine_kwargs: Optional[Dict[str, Any]] = None,
+                 read_chunksize: Optional[int] = None,
                  ):
         """Create a ScenarioDbManager.
 
@@ -515,6 +581,20 @@ class ScenarioDbManager():
         :param future: bool. The `future` flag set on the SQLAlchemy db engine. Will enforce SQLAlchemy 2.0 API changes.
         Allows for easier to read constraints during data checking.
         False for backward compatibity reasons. Potentially may cause name conflicts of pattern doesn't generate a unique name.
+        :param insert_method: The `method` of the DataFrame.to_sql in the bulk insert. None (default) uses an executemany of single-row inserts.
+        'multi' uses multi-row INSERT statements, which can reduce the number of round-trips to a remote DB (e.g. DB2).
+        Note that for SQLite, 'multi' is a lot slower than the default.
+        :param insert_chunksize: The `chunksize` of the DataFrame.to_sql in the bulk insert.
+        If None and insert_method is 'multi', the chunksize is derived from the number of columns, to stay well within the DB bind-parameter limits.
+        :param engine_kwargs: Additional keyword arguments for the `sqlalchemy.create_engine`, e.g. connection pool settings.
+        For DB2 and PostgreSQL, the pool defaults to `pool_pre_ping=True, pool_use_lifo=True, pool_recycle=1800`,
+        which re-uses warm connections and avoids errors on connections dropped by the server. Values in engine_kwargs take precedence.
+        If engine_kwargs specifies a `poolclass`, these pool defaults are not added.
+        For the in-memory SQLite DB, use e.g. `poolclass=sqlalchemy.pool.StaticPool, connect_args={'check_same_thread': False}`
+        to share the same DB between threads.
+        :param read_chunksize: If not None, the scenario tables are read from the DB in chunks of this number of rows,
+        which are then concatenated. Reduces the peak memory when reading large tables, at about the same speed.
+        Note that the dtype of a column can differ from a read in one go, e.g. if a chunk only has NULL values in that column.
 
         Regarding the db_type, for backwards compatibility reasons, the logic is:
         1. If no credentials: create a SQLite DB
@@ -531,6 +611,11 @@ class ScenarioDbManager():
         self.enable_debug_print = enable_debug_print
         self.enable_scenario_seq = enable_scenario_seq
         self.echo = echo
+        self.insert_method = insert_method
+        self.insert_chunksize = insert_chunksize
+        self.engine_kwargs = engine_kwargs
+        self.read_chunksize = read_chunksize
+        self._table_names_in_db: Optional[set] = None  # Cache of tables in the DB schema. See `_get_table_names_in_db`
         self.input_db_tables = self._add_scenario_db_table(input_db_tables)
         self.output_db_tables = output_db_tables
         self.db_tables: Dict[str, ScenarioDbTable] = OrderedDict(list(input_db_tables.items()) + list(output_db_tables.items()))  # {**input_db_tables, **output_db_tables}  # For compatibility reasons
@@ -623,10 +708,25 @@ class ScenarioDbManager():
         #     engine = self._create_sqllite_engine(echo)
         return engine
 
+    def _get_engine_kwargs(self, pooled: bool = True) -> Dict[str, Any]:
+        """Keyword arguments for the `sqlalchemy.create_engine`. See `engine_kwargs` in the constructor.
+
+        :param pooled: If True, adds the default connection pool settings for a remote DB.
+        The defaults are skipped if engine_kwargs specifies a `poolclass`, since they may not apply to that pool (e.g. NullPool).
+        """
+        if pooled and (self.engine_kwargs is None or 'poolclass' not in self.engine_kwargs):
+            kwargs = dict(pool_pre_ping=True, pool_use_lifo=True, pool_recycle=1800)
+        else:
+            kwargs = {}
+        if self.engine_kwargs is not None:
+            kwargs.update(self.engine_kwargs)
+        return kwargs
+
     def _create_sqllite_engine(self, echo: bool):
         if self.enable_sqlite_fk:
             ScenarioDbManager._enable_sqlite_foreign_key_checks()
-        return sqlalchemy.create_engine('sqlite:///:memory:', echo=echo, future=self.future)
+        return sqlalchemy.create_engine('sqlite:///:memory:', echo=echo, future=self.future,
+                                        **self._get_engine_kwargs(pooled=False))
 
     @staticmethod
     def _enable_sqlite_foreign_key_checks():
@@ -750,7 +850,7 @@ class ScenarioDbManager():
         Connection string logic in `get_db2_connection_string`
         """
         connection_string = self._get_db2_connection_string(credentials, schema)
-        return sqlalchemy.create_engine(connection_string, echo=echo, future=self.future)
+        return sqlalchemy.create_engine(connection_string, echo=echo, future=self.future, **self._get_engine_kwargs())
 
     def _get_pg_connection_string(self, credentials, schema: str):
         """Create a PostgreSQL connection string.
@@ -783,7 +883,7 @@ class ScenarioDbManager():
         Connection string logic in `_get_pg_connection_string`
         """
         connection_string = self._get_pg_connection_string(credentials, schema)
-        return sqlalchemy.create_engine(connection_string, echo=echo, future=self.future)
+        return sqlalchemy.create_engine(connection_string, echo=echo, future=self.future, **self._get_engine_kwargs())
 
     def _initialize_db_tables(self):
         # Register dbm with table so it can have access to settings
@@ -879,6 +979,7 @@ class ScenarioDbManager():
         However, the order is alphabetically, which causes FK constraint violations due to not deleting the tables in the right order
         """
         print(f"Dropping tables")
+        self._table_names_in_db = None
         try:
             self._drop_all_tables_transaction_reflect(connection, schema=self.schema)
             print(f"Dropped tables using reflect")
@@ -940,12 +1041,14 @@ class ScenarioDbManager():
         See https://docs.sqlalchemy.org/en/14/core/metadata.html#sqlalchemy.schema.MetaData.drop_all
         """
         # sql = f"DROP SCHEMA {schema} CASCADE"  # Not allowed in DB2!
-        sql = f"CALL SYSPROC.ADMIN_DROP_SCHEMA('{schema}', NULL, 'ERRORSCHEMA', 'ERRORTABLE')"
+        # sql = f"CALL SYSPROC.ADMIN_DROP_SCHEMA('{schema}', NULL, 'ERRORSCHEMA', 'ERRORTABLE')"
         # sql = f"CALL SYSPROC.ADMIN_DROP_SCHEMA('{schema}', NULL, NULL, NULL)"
+        sql = sqlalchemy.sql.text("CALL SYSPROC.ADMIN_DROP_SCHEMA(:schema, NULL, 'ERRORSCHEMA', 'ERRORTABLE')")
         if connection is None:
-            r = self.engine.execute(sql)
+            with self.engine.begin() as connection:
+                r = connection.execute(sql, {'schema': schema})
         else:
-            r = connection.execute(sql)
+            r = connection.execute(sql, {'schema': schema})
 
     #####################################################################################
     # DEPRECATED(?): `insert_scenarios_in_db` and `insert_scenarios_in_db_transaction`
@@ -994,6 +1097,24 @@ class ScenarioDbManager():
         else:
             self._replace_scenario_in_db_transaction(self.engine, scenario_name=scenario_name, inputs=inputs, outputs=outputs, bulk=bulk)
 
+    def replace_scenarios_in_db(self, scenarios: Dict[str, Tuple[Inputs, Outputs]], bulk=True):
+        """Insert or replace multiple scenarios.
+        Same as `replace_scenario_in_db` for each scenario, but all scenarios in one transaction (when enabled):
+        either all scenarios are replaced or none. Avoids a transaction (and connection checkout) per scenario.
+
+        :param scenarios: Dict[scenario_name, (inputs, outputs)]
+        :param bulk:
+        :return:
+        """
+        if self.enable_transactions:
+            print(f"Replacing {len(scenarios)} scenarios within transaction")
+            with self.engine.begin() as connection:
+                for scenario_name, (inputs, outputs) in scenarios.items():
+                    self._replace_scenario_in_db_transaction(connection, scenario_name=scenario_name, inputs=inputs, outputs=outputs, bulk=bulk)
+        else:
+            for scenario_name, (inputs, outputs) in scenarios.items():
+                self._replace_scenario_in_db_transaction(self.engine, scenario_name=scenario_name, inputs=inputs, outputs=outputs, bulk=bulk)
+
     def _replace_scenario_in_db_transaction(self, connection, scenario_name: str, inputs: Inputs = {}, outputs: Outputs = {},
                                             bulk: bool = True):
         """Replace a single full scenario in the DB. If doesn't exist, will insert.
@@ -1053,7 +1174,19 @@ class ScenarioDbManager():
                     print(f"No table named {scenario_table_name} in inputs or outputs")
         return num_caught_exceptions
 
-    def _insert_table_in_db_by_row(self, db_table: ScenarioDbTable, df: pd.DataFrame, connection=None) -> int:
+    def get_to_sql_kwargs(self, num_columns: int) -> Dict[str, Any]:
+        """Returns the `method` and `chunksize` keyword arguments for the DataFrame.to_sql in a bulk insert.
+        See the `insert_method` and `insert_chunksize` in the constructor.
+
+        :param num_columns: number of columns inserted. Used to derive the chunksize for the 'multi' insert_method.
+        """
+        chunksize = self.insert_chunksize
+        if chunksize is None and self.insert_method == 'multi':
+            chunksize = max(1, 2000 // max(1, num_columns))  # Keep the number of bind-parameters per statement limited
+        return {'method': self.insert_method, 'chunksize': chunksize}
+
+    def _insert_table_in_db_by_row(self, db_table: ScenarioDbTable, df: pd.DataFrame, connection=None,
+                                   batch_size: int = 10000) -> int:
         """Inserts a table in the DB row-by-row.
         For debugging FK/PK data issues.
         Uses a single SQL insert statement for each row in the DataFrame so that if there is a FK/PK issue,
@@ -1063,39 +1196,73 @@ class ScenarioDbManager():
         To avoid too many exceptions, the number of exceptions per table is limited to 10.
         After the limit, the insert will be terminated. And the next table will be inserted.
         Note that as a result of terminating a table insert, it is very likely it will cause FK issues in subsequent tables.
+
+        For performance, the rows are first inserted in batches of `batch_size` rows, using a single executemany per batch.
+        Each batch is inserted atomically (in a savepoint when a connection is passed).
+        Only if a batch fails, that batch is rolled back and re-inserted row-by-row to report the errors as described above.
+        Each row is also inserted in a savepoint, so that a failed row doesn't abort the transaction (e.g. in PostgreSQL).
+        Without a connection, all batches/rows are inserted with a single connection, committing each batch/row.
+        Exception: with a connection to SQLite, the rows are inserted one-by-one in the transaction of the connection,
+        without batches and savepoints. The pysqlite driver doesn't support savepoints properly (the RELEASE of a savepoint
+        commits the rows), and in SQLite a failed row doesn't abort the transaction.
         """
         # Replace NaN with None to avoid FK problems:
         # df = df.replace({float('NaN'): None})
         df = ScenarioDbTable.fixNanNoneNull(df)
 
-        num_exceptions = 0
-        max_num_exceptions = 10
         columns, df2 = db_table.get_df_column_names_2(df=df)  # Adds missing columns with None values
         #         print(columns)
         # df[columns] ensures that the order of columns in the DF matches that of the SQL table definition. If not, the insert will fail
-        for row in df2[columns].itertuples(index=False):
-            # print(row)
-            stmt = (
-                sqlalchemy.insert(db_table.table_metadata).values(row)
-            )
-            try:
-                if connection is None:
-                    self.engine.execute(stmt)
-                else:
-                    connection.execute(stmt)
-            except exc.IntegrityError as e:
-                print("++++++++++++Integrity Error+++++++++++++")
-                print(e)
-                num_exceptions = num_exceptions + 1
-            except exc.StatementError as e:
-                print("++++++++++++Statement Error+++++++++++++")
-                print(e)
-                num_exceptions = num_exceptions + 1
-            finally:
-                if num_exceptions > max_num_exceptions:
-                    print(
-                        f"Max number of exceptions {max_num_exceptions} for this table exceeded. Stopped inserting more data.")
-                    break
+        stmt = sqlalchemy.insert(db_table.table_metadata)
+        records = df2[columns].to_dict(orient='records')
+        if connection is None:
+            with self.engine.connect() as conn:
+                return self._insert_records_in_db_by_row(stmt, records, conn, conn.begin, batch_size)
+        if connection.dialect.name == 'sqlite':
+            return self._insert_records_in_db_by_row(stmt, records, connection, contextlib.nullcontext, batch_size=1)
+        return self._insert_records_in_db_by_row(stmt, records, connection, connection.begin_nested, batch_size)
+
+    def _insert_records_in_db_by_row(self, stmt, records: List[Dict[str, Any]], connection, begin: Callable,
+                                     batch_size: int = 10000, max_num_exceptions: int = 10) -> int:
+        """See `_insert_table_in_db_by_row`.
+
+        :param stmt: the (table) insert statement
+        :param records: the rows to insert, as a dict per row
+        :param connection: the connection to execute the inserts on
+        :param begin: function of the connection that starts the (nested) transaction for each batch/row,
+        i.e. `connection.begin` or `connection.begin_nested`, or `contextlib.nullcontext` for no transaction
+        :param batch_size: number of rows per batch. If 1, inserts row-by-row only.
+        :return: number of exceptions
+        """
+        num_exceptions = 0
+        for i in range(0, len(records), batch_size):
+            batch = records[i:i + batch_size]
+            if len(batch) > 1:
+                try:
+                    with begin():
+                        connection.execute(stmt, batch)
+                    continue
+                except (exc.IntegrityError, exc.StatementError):
+                    pass  # Batch has been rolled back. Re-insert row-by-row to report the offending rows.
+            for row in batch:
+                try:
+                    with begin():
+                        connection.execute(stmt, row)
+                except exc.IntegrityError as e:
+                    print("++++++++++++Integrity Error+++++++++++++")
+                    print(e)
+                    num_exceptions = num_exceptions + 1
+                except exc.StatementError as e:
+                    print("++++++++++++Statement Error+++++++++++++")
+                    print(e)
+                    num_exceptions = num_exceptions + 1
+                finally:
+                    if num_exceptions > max_num_exceptions:
+                        print(
+                            f"Max number of exceptions {max_num_exceptions} for this table exceeded. Stopped inserting more data.")
+                        break
+            if num_exceptions > max_num_exceptions:
+                break
         return num_exceptions
 
     def insert_tables_in_db(self, inputs: Inputs = {}, outputs: Outputs = {},
@@ -1213,30 +1380,35 @@ class ScenarioDbManager():
     def _read_scenario_from_db_multi_threaded(self, scenario_name) -> (Inputs, Outputs):
         """Reads all tables from a scenario using multi-threading.
         Does NOT seem to result in performance improvement!"""
-        class ReadTableFunction(object):
-            def __init__(self, dbm):
-                self.dbm = dbm
-            def __call__(self, scenario_table_name, db_table):
-                return self._read_scenario_db_table_from_db_thread(scenario_table_name, db_table)
-            def _read_scenario_db_table_from_db_thread(self, scenario_table_name, db_table):
-                with self.dbm.engine.begin() as connection:
-                    df = self.dbm._read_scenario_db_table_from_db(scenario_name, db_table, connection)
-                    dict = {scenario_table_name: df}
-                return dict
-
-        thread_number = 8
-        pool = ThreadPool(thread_number)
-        thread_worker = ReadTableFunction(self)
-        # print("ThreadPool created")
-        all_tables = [(scenario_table_name, db_table) for scenario_table_name, db_table in self.db_tables.items() if scenario_table_name != 'Scenario']
-        # print(all_tables)
-        all_results = pool.starmap(thread_worker, all_tables)
-        inputs = {k:v for element in all_results for k,v in element.items() if k in self.input_db_tables.keys()}
-        outputs = {k:v for element in all_results for k,v in element.items() if k in self.output_db_tables.keys()}
-        # print("All tables loaded")
-
+        db_tables = {scenario_table_name: db_table for scenario_table_name, db_table in self.db_tables.items() if scenario_table_name != 'Scenario'}
+        dfs = self._read_db_tables_multi_threaded(
+            lambda db_table, connection: self._read_scenario_db_table_from_db(scenario_name, db_table, connection), db_tables)
+        inputs = {k: v for k, v in dfs.items() if k in self.input_db_tables}
+        outputs = {k: v for k, v in dfs.items() if k in self.output_db_tables}
         return inputs, outputs
 
+    def _read_db_tables_multi_threaded(self, read_function: Callable[[ScenarioDbTable, Any], pd.DataFrame],
+                                       db_tables: Dict[str, ScenarioDbTable], max_workers: int = 8) -> Dict[str, pd.DataFrame]:
+        """Reads the db_tables concurrently, each in its own thread and connection (from the engine's pool).
+        Only useful for a remote DB where the reads are latency-bound.
+        Does NOT work with the (default) in-memory SQLite DB, since each thread gets its own connection, i.e. a different DB.
+        Keep the max_workers within the pool_size of the engine to avoid waiting for connections.
+
+        :param read_function: function(db_table, connection) -> pd.DataFrame
+        :param db_tables: Dict[scenario_table_name, ScenarioDbTable] to read
+        :param max_workers: maximum number of threads
+        :return: Dict[scenario_table_name, pd.DataFrame] in the same order as db_tables
+        """
+        def read_table(db_table):
+            with self.engine.begin() as connection:
+                return read_function(db_table, connection)
+
+        if len(db_tables) == 0:
+            return {}
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(db_tables)))) as executor:
+            futures = {scenario_table_name: executor.submit(read_table, db_table) for scenario_table_name, db_table in db_tables.items()}
+            return {scenario_table_name: future.result() for scenario_table_name, future in futures.items()}
+
     def read_scenario_input_tables_from_db(self, scenario_name: str) -> Inputs:
         """Convenience method to load all input tables.
         Typically used at start if optimization model.
@@ -1299,36 +1471,59 @@ class ScenarioDbManager():
     def _read_scenario_db_table_from_db(self, scenario_name: str, db_table: ScenarioDbTable, connection) -> pd.DataFrame:
         """Read one table from the DB.
         Removes the `scenario_name` column.
+        (Or the `scenario_seq` column. Is not selected in the SQL, so is never transferred from the DB.)
 
         Modification: based on SQLAlchemy syntax. If doing the plain text SQL, then some column names not properly extracted
         """
         db_table_name = db_table.db_table_name
         t: sqlalchemy.Table = db_table.get_sa_table()
+        scenario_column_name = 'scenario_seq' if self.enable_scenario_seq else 'scenario_name'
+        if db_table_name != 'scenario':
+            columns = [c for c in t.columns if c.name != scenario_column_name]
+        else:
+            columns = list(t.columns)
         if self.enable_scenario_seq:
             s: sqlalchemy.Table = self.get_scenario_sa_table()
-            sql = t.select().where(t.c.scenario_seq == s.c.scenario_seq).where(s.c.scenario_name == scenario_name)
-            df = pd.read_sql(sql, con=connection)
-            if db_table_name != 'scenario':
-                df = df.drop(columns=['scenario_seq'])
+            sql = sqlalchemy.select(*columns).where(t.c.scenario_seq == s.c.scenario_seq).where(s.c.scenario_name == scenario_name)
         else:
-            sql = t.select().where(t.c.scenario_name == scenario_name)  # This is NOT a simple string!
-            df = pd.read_sql(sql, con=connection)
-            if db_table_name != 'scenario':
-                df = df.drop(columns=['scenario_name'])
+            sql = sqlalchemy.select(*columns).where(t.c.scenario_name == scenario_name)  # This is NOT a simple string!
+        df = self._read_sql(sql, connection)
 
         return df
 
+    def _read_sql(self, sql, connection) -> pd.DataFrame:
+        """Reads the result of the sql in a DataFrame. If `read_chunksize` is set, reads in chunks."""
+        if self.read_chunksize is None:
+            return pd.read_sql(sql, con=connection)
+        chunks = list(pd.read_sql(sql, con=connection, chunksize=self.read_chunksize))
+        if len(chunks) == 1:
+            return chunks[0]
+        elif len(chunks) == 0:  # No rows: returns no chunks, but we still need the columns
+            return pd.read_sql(sql, con=connection)
+        return pd.concat(chunks, ignore_index=True, copy=False)
+
     ############################################################################################
     # Read multi scenario
     ############################################################################################
     def read_multi_scenario_tables_from_db(self, scenario_names: List[str],
                                            input_table_names: Optional[List[str]] = None,
-                                           output_table_names: Optional[List[str]] = None) -> (Inputs, Outputs):
+                                           output_table_names: Optional[List[str]] = None,
+                                           multi_threaded: bool = False) -> (Inputs, Outputs):
         """Read selected set input and output tables from multiple scenarios.
         If input_table_names/output_table_names contains a '*', then all input/output tables will be read.
         If empty list or None, then no tables will be read.
+        If multi_threaded, reads the tables concurrently, each with its own connection.
+        Can reduce the latency for a remote DB. Does not work with the in-memory SQLite DB.
         """
-        if self.enable_transactions:
+        if multi_threaded:
+            input_table_names, output_table_names = self._get_multi_scenario_table_names(input_table_names, output_table_names)
+            db_tables = {**{k: v for k, v in self.input_db_tables.items() if k in input_table_names},
+                         **{k: v for k, v in self.output_db_tables.items() if k in output_table_names}}
+            dfs = self._read_db_tables_multi_threaded(
+                lambda db_table, connection: self._read_multi_scenario_db_table_from_db(scenario_names, db_table, connection), db_tables)
+            inputs = {k: v for k, v in dfs.items() if k in self.input_db_tables}
+            outputs = {k: v for k, v in dfs.items() if k in self.output_db_tables}
+        elif self.enable_transactions:
             with self.engine.begin() as connection:
                 inputs, outputs = self._read_multi_scenario_tables_from_db(connection, scenario_names, input_table_names, output_table_names)
         else:
@@ -1341,6 +1536,21 @@ class ScenarioDbManager():
         """Loads data for selected input and output tables from multiple scenarios.
         If either list is names is ['*'], will load all tables as defined in db_tables configuration.
         """
+        input_table_names, output_table_names = self._get_multi_scenario_table_names(input_table_names, output_table_names)
+        inputs = {}
+        for scenario_table_name, db_table in self.input_db_tables.items():
+            if scenario_table_name in input_table_names:
+                inputs[scenario_table_name] = self._read_multi_scenario_db_table_from_db(scenario_names, db_table, connection=connection)
+        outputs = {}
+        for scenario_table_name, db_table in self.output_db_tables.items():
+            if scenario_table_name in output_table_names:
+                outputs[scenario_table_name] = self._read_multi_scenario_db_table_from_db(scenario_names, db_table, connection=connection)
+        return inputs, outputs
+
+    def _get_multi_scenario_table_names(self, input_table_names: Optional[List[str]] = None,
+                                        output_table_names: Optional[List[str]] = None) -> (List[str], List[str]):
+        """Resolves the input and output table names to read in `read_multi_scenario_tables_from_db`.
+        Replaces ['*'] with all tables. Always includes the Scenario table."""
         if input_table_names is None:  # load no tables by default
             input_table_names = []
         elif '*' in input_table_names:
@@ -1354,16 +1564,7 @@ class ScenarioDbManager():
             output_table_names = []
         elif '*' in output_table_names:
             output_table_names = self.output_db_tables.keys()
-
-        inputs = {}
-        for scenario_table_name, db_table in self.input_db_tables.items():
-            if scenario_table_name in input_table_names:
-                inputs[scenario_table_name] = self._read_multi_scenario_db_table_from_db(scenario_names, db_table, connection=connection)
-        outputs = {}
-        for scenario_table_name, db_table in self.output_db_tables.items():
-            if scenario_table_name in output_table_names:
-                outputs[scenario_table_name] = self._read_multi_scenario_db_table_from_db(scenario_names, db_table, connection=connection)
-        return inputs, outputs
+        return input_table_names, output_table_names
 
     def _read_multi_scenario_db_table_from_db(self, scenario_names: List[str], db_table: ScenarioDbTable, connection) -> pd.DataFrame:
         """Read one table from the DB for multiple scenarios.
@@ -1383,7 +1584,7 @@ class ScenarioDbManager():
         else:
             sql = t.select().where(t.c.scenario_name.in_(scenario_names))  # This is NOT a simple string!
 
-        df = pd.read_sql(sql, con=connection)
+        df = self._read_sql(sql, connection)
         return df
 
     ############################################################################################
@@ -1455,7 +1656,8 @@ class ScenarioDbManager():
         # 2. Delete all output tables
         for scenario_table_name, db_table in reversed(self.output_db_tables.items()):  # Note this INCLUDES the SCENARIO table!
             if (scenario_table_name != 'Scenario'):
-                db_table._delete_scenario_table_from_db(scenario_name, connection)
+                db_table._delete_scenario_table_from_db(scenario_name, connection,
+                                                        scenario_seqs=[scenario_seq] if self.enable_scenario_seq else None)
         # 3. Insert new data
         for scenario_table_name, db_table in self.output_db_tables.items():  # Note this INCLUDES the SCENARIO table!
             if (scenario_table_name != 'Scenario') and scenario_table_name in outputs.keys():  # If in given set of tables to replace
@@ -1680,8 +1882,9 @@ class ScenarioDbManager():
         TODO: batch all sql statements in single execute. Faster? And will that do the defer integrity checks?
         """
         # batch_sql=False  # Batch=True does NOT work!
-        insp = sqlalchemy.inspect(connection)
-        tables_in_db = insp.get_table_names(schema=self.schema)
+        tables_in_db = self._get_table_names_in_db(connection)
+        # Query the scenario_seqs once for all tables. Needs to be done before the scenario table row is deleted.
+        scenario_seqs = self._get_scenario_seqs(scenario_name, connection) if self.enable_scenario_seq else None
         # sql_statements = []
         for scenario_table_name, db_table in reversed(self.db_tables.items()):  # Note this INCLUDES the SCENARIO table!
             if db_table.db_table_name in tables_in_db:
@@ -1689,7 +1892,24 @@ class ScenarioDbManager():
                 # t = db_table.table_metadata  # A Table()
                 # sql = t.delete().where(t.c.scenario_name == scenario_name)
                 # connection.execute(sql)
-                db_table._delete_scenario_table_from_db(scenario_name, connection)
+                db_table._delete_scenario_table_from_db(scenario_name, connection, scenario_seqs=scenario_seqs)
+
+    def _get_table_names_in_db(self, connection) -> set:
+        """Returns the names of the tables in the DB schema.
+        Cached, as long as all tables in db_tables exist. Only if one is missing, the DB is inspected again,
+        so tables created in the meantime (e.g. by another process) are picked up.
+        The cache is cleared when dropping the tables."""
+        if (self._table_names_in_db is None
+                or any(db_table.db_table_name not in self._table_names_in_db for db_table in self.db_tables.values())):
+            insp = sqlalchemy.inspect(connection)
+            self._table_names_in_db = set(insp.get_table_names(schema=self.schema))
+        return self._table_names_in_db
+
+    def _get_scenario_seqs(self, scenario_name: str, connection) -> List[int]:
+        """For scenario_seq option.
+        Returns the scenario_seqs of all entries in the scenario table matching the scenario_name."""
+        s = self.get_scenario_sa_table()
+        return [r.scenario_seq for r in connection.execute(sqlalchemy.select(s.c.scenario_seq).where(s.c.scenario_name == scenario_name))]
 
     def _get_or_create_scenario_in_scenario_table(self, scenario_name: str, connection) -> int:
         """For scenario_seq option
@@ -1965,17 +2185,24 @@ class ScenarioDbManager():
         """Drops the column `scenario_name` from any df in either inputs or outputs.
         This is used to create a inputs/outputs combination similar to loading a single scenario from the DO Experiment.
         """
-        new_inputs = {}
-        new_outputs = {}
-        for scenario_table_name, df in inputs.items():
-            if 'scenario_name' in df.columns:
-                df = df.drop(columns=['scenario_name'])
-                new_inputs[scenario_table_name] = df
-        for scenario_table_name, df in outputs.items():
-            if 'scenario_name' in df.columns:
-                df = df.drop(columns=['scenario_name'])
-                new_outputs[scenario_table_name] = df
-        return new_inputs, new_outputs
+        return (ScenarioDbManager._delete_column_from_dfs('scenario_name', inputs),
+                ScenarioDbManager._delete_column_from_dfs('scenario_name', outputs))
+
+    @staticmethod
+    def _delete_column_from_dfs(column_name: str, dfs: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
+        """Returns a new dict with the column removed from each df that has it. Other dfs are included as-is.
+        If none of the dfs has the column, returns the dfs dict itself.
+        Does not change the dfs in the input dict. Uses a shallow copy and a `del`, which, unlike a `drop`,
+        does not copy the data of the other columns."""
+        if not any(column_name in df.columns for df in dfs.values()):
+            return dfs
+        new_dfs = {}
+        for scenario_table_name, df in dfs.items():
+            if column_name in df.columns:
+                df = df.copy(deep=False)
+                del df[column_name]
+            new_dfs[scenario_table_name] = df
+        return new_dfs
 
     @staticmethod
     def add_scenario_seq_to_dfs(scenario_seq: int, inputs: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
@@ -1995,17 +2222,8 @@ class ScenarioDbManager():
         Drops the column `scenario_seq` from any df in either inputs or outputs.
         This is used to create a inputs/outputs combination similar to loading a single scenario from the DO Experiment.
         """
-        new_inputs = {}
-        new_outputs = {}
-        for scenario_table_name, df in inputs.items():
-            if 'scenario_seq' in df.columns:
-                df = df.drop(columns=['scenario_seq'])
-                new_inputs[scenario_table_name] = df
-        for scenario_table_name, df in outputs.items():
-            if 'scenario_seq' in df.columns:
-                df = df.drop(columns=['scenario_seq'])
-                new_outputs[scenario_table_name] = df
-        return new_inputs, new_outputs
+        return (ScenarioDbManager._delete_column_from_dfs('scenario_seq', inputs),
+                ScenarioDbManager._delete_column_from_dfs('scenario_seq', outputs))
 
     #####################################################################################################
     # Insert, Update, Delete row
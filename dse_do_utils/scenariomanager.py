@@ -86,7 +86,7 @@ class ScenarioManager(object):
                  local_root: Optional[Union[str, Path]] = None, project_id: Optional[str] = None, project_access_token: Optional[str] = None, project=None,
                  template_scenario_name: Optional[str] = None, platform: Optional[Platform] = None,
                  inputs: Inputs = None, outputs: Outputs = None,
-                 local_relative_data_path: str = 'assets/data_asset', data_directory: str = None):
+                 local_relative_data_path: str = 'assets/data_asset', data_directory: str = None, client=None):
         """Create a ScenarioManager.
 
         Template_scenario_name: name of a scenario with an (empty but) valid model that has been successfully run at least once.
@@ -110,6 +110,8 @@ class ScenarioManager(object):
             platform (Platform): Optionally control the platform (`CPDaaS`, `CPD40`, `CPD25`, and `Local`). If None, will try to detect automatically.
             local_relative_data_path (str): relative directory from the local_root. Used as default data_directory
             data_directory (str): Full path of data directory. Will override the platform dependent process.
+            client (decision_optimization_client.Client): Client to access the DO scenarios. If None, a new Client is created for each access.
+                E.g. to share one Client when loading many scenarios.
         """
         self.model_name = model_name
         self.scenario_name = scenario_name
@@ -122,6 +124,7 @@ class ScenarioManager(object):
         self.template_scenario_name = template_scenario_name
         self.local_relative_data_path = local_relative_data_path
         self.data_directory = data_directory
+        self.client = client
         if platform is None:
             platform = ScenarioManager.detect_platform()
         self.platform = platform
@@ -1168,8 +1171,10 @@ class ScenarioManager(object):
 
     def get_dd_client(self):
         """Return the Client managing the DO scenario.
-        Returns: new decision_optimization_client.Client
+        Returns: the client passed in the constructor, or else a new decision_optimization_client.Client
         """
+        if self.client is not None:
+            return self.client
         from decision_optimization_client import Client
         if self.project is not None:
             pc = self.project.project_context
@@ -0,0 +1,55 @@
+import io
+import os
+
+import requests
+
+from dse_do_utils.domodelexporter import DOModelExporter
+
+
+class _Response(requests.Response):
+    def __init__(self, status_code: int):
+        super().__init__()
+        self.status_code = status_code
+        self._content = b'{"errors": [{"message": "Not found"}]}'
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_get_do_model_export_web_closes_response():
+    for status_code in [400, 404, 500]:
+        with DOModelExporter(do_model_names=['Model1'], cpd_cluster_host='https://localhost', project_id='p',
+                             access_token='t') as me:
+            me.session.get = lambda *args, **kwargs: _Response(status_code)
+            response = me.get_do_model_export_web('Model1')
+        assert response.status_code == status_code
+        assert response.closed
+
+
+def create_streamed_response(status_code: int, body: bytes) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status_code
+    response.raw = io.BytesIO(body)
+    return response
+
+
+def test_get_do_model_export_web_returns_error_body():
+    for status_code in [400, 404, 500]:
+        with DOModelExporter(do_model_names=['Model1'], cpd_cluster_host='https://localhost', project_id='p',
+                             access_token='t') as me:
+            me.session.get = lambda *args, **kwargs: create_streamed_response(
+                status_code, b'{"errors": [{"message": "Not found"}]}')
+            response = me.get_do_model_export_web('Model1')
+        assert response.json() == {'errors': [{'message': 'Not found'}]}
+
+
+def test_get_do_model_export_web_writes_zip(tmp_path):
+    with DOModelExporter(do_model_names=['Model1'], cpd_cluster_host='https://localhost', project_id='p',
+                         access_token='t', export_directory=str(tmp_path)) as me:
+        me.session.get = lambda *args, **kwargs: create_streamed_response(200, b'zip content')
+        response = me.get_do_model_export_web('Model1')
+    assert response.status_code == 200
+    [file_name] = os.listdir(tmp_path)
+    with open(os.path.join(tmp_path, file_name), 'rb') as f:
+        assert f.read() == b'zip content'
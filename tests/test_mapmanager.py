@@ -0,0 +1,56 @@
+import math
+import subprocess
+import sys
+from types import SimpleNamespace
+
+import folium
+import numpy as np
+
+from dse_do_utils.mapmanager import MapManager
+
+
+def test_get_bearings():
+    lat1 = np.array([0.0, 0.0, 0.0, 0.0, 52.37, np.nan, 0.0])
+    lon1 = np.array([0.0, 0.0, 0.0, 0.0, 4.90, 0.0, 0.0])
+    lat2 = np.array([1.0, 0.0, -1.0, 0.0, 48.86, 1.0, np.inf])
+    lon2 = np.array([0.0, 1.0, 0.0, -1.0, 2.35, 1.0, 0.0])
+    with np.errstate(invalid='ignore'):  # sin/cos of inf
+        bearings = MapManager.get_bearings(lat1, lon1, lat2, lon2)
+    np.testing.assert_allclose(bearings[:4], [0.0, 90.0, 180.0, 270.0], atol=1e-9)
+    assert math.isclose(bearings[4], MapManager.get_bearing(SimpleNamespace(lat=52.37, lon=4.90),
+                                                           SimpleNamespace(lat=48.86, lon=2.35)))
+    assert np.isnan(bearings[5:]).all()
+
+
+def test_add_bar_chart_in_map():
+    m = folium.Map()
+    MapManager().add_bar_chart_in_map(m, [0, 0], quantities=[1.4, np.nan, 2.6, np.inf], bar_height_per_unit=10)
+    bar_chart = [child for child in m._children.values() if isinstance(child, folium.FeatureGroup)][0]
+    icon_sizes = [marker.icon.options['icon_size'] for marker in bar_chart._children.values()]
+    assert icon_sizes == [[20, 14], [20, 0], [20, 26], [20, 0]]
+    assert all(isinstance(height, int) for _, height in icon_sizes)
+
+
+def test_get_bearings_numba_same_as_numpy():
+    rng = np.random.default_rng(0)
+    n = 1000
+    lat1, lat2 = rng.uniform(-80, 80, (2, n))
+    lon1, lon2 = rng.uniform(-180, 180, (2, n))
+    lat1[:2] = [np.nan, np.inf]
+    numba_min_bearings = MapManager.numba_min_bearings
+    try:
+        MapManager.numba_min_bearings = 0
+        bearings_1 = MapManager.get_bearings(lat1, lon1, lat2, lon2)
+        MapManager.numba_min_bearings = n + 1
+        with np.errstate(invalid='ignore'):  # sin/cos of inf
+            bearings_2 = MapManager.get_bearings(lat1, lon1, lat2, lon2)
+    finally:
+        MapManager.numba_min_bearings = numba_min_bearings
+    np.testing.assert_allclose(bearings_1, bearings_2, rtol=1e-12, atol=1e-9)
+    assert np.isnan(bearings_1[:2]).all()
+
+
+def test_import_does_not_import_numba():
+    """numba is only imported on the first `get_bearings` call that uses the kernel."""
+    code = "import sys, dse_do_utils.mapmanager; assert 'numba' not in sys.modules"
+    subprocess.run([sys.executable, '-c', code], check=True)
@@ -0,0 +1,103 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from dse_do_utils.multiscenariomanager import MultiScenarioManager
+from dse_do_utils.scenariomanager import ScenarioManager
+
+SCENARIO_NAMES = [f's{i}' for i in range(6)]
+
+
+class FakeClient:
+    """Stands in for the dd_scenario and decision_optimization_client Clients. Counts the Clients created."""
+    num_created = 0
+
+    def __init__(self, pc=None):
+        FakeClient.num_created += 1
+
+    def get_model_builder(self, name):
+        return SimpleNamespace(get_scenarios=lambda as_dict: {scenario_name: None for scenario_name in SCENARIO_NAMES})
+
+    def get_experiment(self, name):
+        scenario = SimpleNamespace(get_tables_data=lambda category: {category: pd.DataFrame({'a': [1]})})
+        return SimpleNamespace(get_scenario=lambda name: scenario)
+
+
+@pytest.fixture(autouse=True)
+def fake_clients(monkeypatch):
+    """Replaces the Clients, so the tests run without a DO environment."""
+    for module_name in ['dd_scenario', 'decision_optimization_client']:
+        monkeypatch.setitem(sys.modules, module_name, SimpleNamespace(Client=FakeClient))
+    monkeypatch.setattr(FakeClient, 'num_created', 0)
+
+
+def test_load_scenarios_reuse_client_per_thread():
+    msm = MultiScenarioManager(model_name='Model', scenario_names=SCENARIO_NAMES)
+    FakeClient.num_created = 0  # Only count the Clients for loading the scenarios
+    msm.get_multi_scenario_data(max_workers=1)
+    assert FakeClient.num_created == 1
+    assert list(msm.inputs['input'].scenario_name) == SCENARIO_NAMES
+    msm.get_multi_scenario_data(max_workers=3)
+    assert FakeClient.num_created <= 1 + 3  # At most one Client per thread
+
+
+def test_merge_scenario_data_scenario_name_dtype():
+    data_by_scenario = {'s1': {'Plant': pd.DataFrame({'plant': ['p1']})},
+                        's2': {'Plant': pd.DataFrame({'plant': ['p1', 'p2']})}}
+    merged = MultiScenarioManager.merge_scenario_data(data_by_scenario)
+    assert merged['Plant'].scenario_name.dtype == object
+    assert list(merged['Plant'].scenario_name) == ['s1', 's2', 's2']
+    merged = MultiScenarioManager.merge_scenario_data(data_by_scenario, categorical_scenario_name=True)
+    assert isinstance(merged['Plant'].scenario_name.dtype, pd.CategoricalDtype)
+    assert list(merged['Plant'].scenario_name.cat.categories) == ['s1', 's2']
+    assert 'scenario_name' not in data_by_scenario['s1']['Plant'].columns
+
+
+def create_multi_scenario_manager(scenario_names) -> MultiScenarioManager:
+    """MultiScenarioManager that loads a small table per scenario."""
+    msm = MultiScenarioManager(model_name='Model', scenario_names=scenario_names)
+    msm.load_data_from_scenario = lambda scenario_name: (
+        {'Plant': pd.DataFrame({'plant': ['p1', 'p2'], 'capacity': [1, 2]})},
+        {'kpis': pd.DataFrame({'NAME': ['cost'], 'VALUE': [len(scenario_name)]})},
+    )
+    return msm
+
+
+def test_get_multi_scenario_data_merges_all_loaded_scenarios():
+    msm = create_multi_scenario_manager(['s1', 's2', 's3'])
+    msm.get_multi_scenario_data(['s1', 's2'])
+    msm.get_multi_scenario_data(['s3'])
+    assert list(msm.inputs['Plant'].scenario_name) == ['s1', 's1', 's2', 's2', 's3', 's3']
+    assert list(msm.outputs['kpis'].scenario_name) == ['s1', 's2', 's3']
+    assert list(msm.inputs['Scenario'].scenario_name) == ['s1', 's2', 's3']
+
+
+def test_get_multi_scenario_data_without_retain_per_scenario():
+    msm = create_multi_scenario_manager(['s1', 's2', 's3'])
+    msm.get_multi_scenario_data(['s1', 's2'], retain_per_scenario=False)
+    msm.get_multi_scenario_data(['s3'], retain_per_scenario=False)
+    assert msm.inputs_by_scenario == {}
+    assert list(msm.inputs['Plant'].scenario_name) == ['s3', 's3']
+
+
+def test_write_data_to_parquet(tmp_path):
+    pytest.importorskip('pyarrow')
+    msm = create_multi_scenario_manager(['s1', 's2'])
+    msm.get_data_directory = lambda: str(tmp_path)
+    msm.get_multi_scenario_data(categorical_scenario_name=True)
+    directory_path = msm.write_data_to_parquet()
+    assert directory_path == os.path.join(str(tmp_path), 'Model_multi_output')
+    data = ScenarioManager.load_data_from_parquet_s(directory_path)
+    assert set(data.keys()) == {'Plant', 'Scenario', 'kpis'}
+    for table_name, df in {**msm.inputs, **msm.outputs}.items():
+        pd.testing.assert_frame_equal(data[table_name], df)
+
+
+def test_write_data_to_parquet_requires_directory_or_model_name():
+    msm = create_multi_scenario_manager(['s1'])
+    msm.model_name = None
+    with pytest.raises(ValueError):
+        msm.write_data_to_parquet()
@@ -0,0 +1,212 @@
+import subprocess
+import sys
+import weakref
+from types import SimpleNamespace
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import pytest
+from docplex.mp.environment import Environment
+
+from dse_do_utils import OptimizationEngine
+
+
+def test_groupby_scal_prod_s():
+    engine = OptimizationEngine()
+    df = pd.DataFrame({'a': [2, 1, 2, 1, np.nan], 'b': ['x', 'x', 'y', 'x', 'x'], 'coef': [1.0, 2.0, 3.0, 4.0, 5.0]})
+    df['xDVar'] = engine.continuous_var_series(df, name='x')
+    x = df.xDVar
+    for keys in [['a'], ['a', 'b']]:
+        expected = df.groupby(keys).apply(lambda group: engine.mdl.scal_prod(group.xDVar.tolist(), group.coef.tolist()))
+        actual = engine.groupby_scal_prod(df, keys, 'xDVar', 'coef')
+        assert actual.index.equals(expected.index)
+        assert actual.index.names == expected.index.names
+        assert [str(e) for e in actual] == [str(e) for e in expected]
+    s = engine.groupby_scal_prod(df, ['a'], 'xDVar', 'coef')
+    assert str(s.loc[1.0]) == str(2 * x[1] + 4 * x[3])
+    assert len(engine.groupby_scal_prod(df.iloc[:0], ['a'], 'xDVar', 'coef')) == 0
+
+
+def test_groupby_scal_prod_s_categorical_key():
+    """Unused categories have no group, also not in the index."""
+    engine = OptimizationEngine()
+    df = pd.DataFrame({'a': pd.Categorical(['x', 'y', 'x', None], categories=['x', 'z', 'y']), 'b': [1, 2, 1, 2],
+                       'coef': [1.0, 2.0, 3.0, 4.0]})
+    df['xDVar'] = engine.continuous_var_series(df, name='x')
+    x = df.xDVar
+    s = engine.groupby_scal_prod(df, ['a'], 'xDVar', 'coef')
+    assert s.index.tolist() == ['x', 'y']
+    assert str(s.loc['x']) == str(x[0] + 3 * x[2])
+    assert str(s.loc['y']) == str(2 * x[1])
+    assert engine.groupby_scal_prod(df, ['a', 'b'], 'xDVar', 'coef').index.tolist() == [('x', 1), ('y', 2)]
+    assert len(engine.groupby_scal_prod(df.iloc[3:], ['a'], 'xDVar', 'coef')) == 0
+
+
+def test_cached_var_series_per_model():
+    engine = OptimizationEngine()
+    df = pd.DataFrame({'a': [1, 2, 3]})
+    x1 = engine.continuous_var_series(df, cached=True, name='x')
+    assert engine.continuous_var_series(df, cached=True, name='x').tolist() == x1.tolist()
+    engine.mdl = engine.create_do_model(name='Model2')
+    x2 = engine.continuous_var_series(df, cached=True, name='x')
+    assert all(v.model is engine.mdl for v in x2)
+    assert engine.mdl.number_of_variables == 3
+
+
+def test_prepare_coefs():
+    weights = [1.0, 2.0, 0.5]
+    matrix = np.arange(12, dtype=float).reshape(3, 4)
+    expected = [weights[i] * matrix[i, j] for i in range(3) for j in range(4)]
+    numba_min_coefs = OptimizationEngine.numba_min_coefs
+    try:
+        for OptimizationEngine.numba_min_coefs in [0, matrix.size + 1]:  # With and without the numba kernel
+            coefs = OptimizationEngine.prepare_coefs(weights, matrix)
+            assert coefs.dtype == np.float64 and coefs.flags['C_CONTIGUOUS']
+            np.testing.assert_allclose(coefs, expected)
+    finally:
+        OptimizationEngine.numba_min_coefs = numba_min_coefs
+    with pytest.raises(ValueError):
+        OptimizationEngine.prepare_coefs([1.0, 2.0], matrix)
+
+
+def test_import_does_not_import_numba():
+    """numba is only imported on the first `prepare_coefs` call that uses the kernel."""
+    code = "import sys, dse_do_utils; assert 'numba' not in sys.modules"
+    subprocess.run([sys.executable, '-c', code], check=True)
+
+
+def test_var_dataframe():
+    engine = OptimizationEngine()
+    df = pd.DataFrame({'cost': [1.0, 2.0]}, index=pd.Index(['a', 'b'], name='item'))
+    df2 = engine.var_dataframe(df, {'xDVar': dict(vartype='integer', ub=10), 'yDVar': dict(vartype='binary'),
+                                    'zDVar': dict(name='z')})
+    assert list(df.columns) == ['cost']
+    assert list(df2.columns) == ['cost', 'xDVar', 'yDVar', 'zDVar']
+    assert df2.index.equals(df.index)
+    assert all(v.is_integer() and v.ub == 10 for v in df2.xDVar)
+    assert all(v.is_binary() for v in df2.yDVar)
+    assert all(v.is_continuous() for v in df2.zDVar)
+    assert df2.xDVar['a'].name.startswith('xDVar') and df2.zDVar['a'].name.startswith('z')
+    assert engine.mdl.number_of_variables == 6
+    with pytest.raises(ValueError):
+        engine.var_dataframe(df, {'xDVar': dict(vartype='semicontinuous')})
+
+
+class _StubSolveEngine(OptimizationEngine):
+    """Engine with a solve() that returns a fixed objective value, without a CPLEX runtime."""
+    def __init__(self, objective_value: Optional[float]):
+        super().__init__()
+        self.objective_value = objective_value
+
+    def solve(self, **kwargs):
+        if self.objective_value is None:
+            return None
+        return SimpleNamespace(objective_value=self.objective_value)
+
+
+def build_stub_engine_1() -> OptimizationEngine:
+    return _StubSolveEngine(1.0)
+
+
+def build_stub_engine_2() -> OptimizationEngine:
+    return _StubSolveEngine(None)
+
+
+def build_stub_engine_3() -> OptimizationEngine:
+    return _StubSolveEngine(3.0)
+
+
+def test_solve_batch_stub():
+    results = OptimizationEngine.solve_batch([build_stub_engine_1, build_stub_engine_2, build_stub_engine_3],
+                                             max_workers=2)
+    assert [objective_value for objective_value, _ in results] == [1.0, None, 3.0]
+    assert results[1][1] is None
+    assert list(results[0][1].columns) == ['NAME', 'VALUE']
+
+
+def build_knapsack_engine() -> OptimizationEngine:
+    engine = OptimizationEngine()
+    df = pd.DataFrame({'value': [4.0, 3.0, 2.0], 'weight': [3.0, 2.0, 1.0]})
+    df = engine.var_dataframe(df, {'xDVar': dict(vartype='binary')})
+    engine.mdl.add_constraint(engine.scal_prod(df.xDVar, df.weight) <= 3)
+    total_value = engine.scal_prod(df.xDVar, df.value)
+    engine.mdl.add_kpi(total_value, 'Total value')
+    engine.mdl.maximize(total_value)
+    return engine
+
+
+def test_solve_batch():
+    assert build_knapsack_engine().mdl.number_of_kpis == 1
+    if not Environment().has_cplex:
+        pytest.skip("No CPLEX runtime")
+    results = OptimizationEngine.solve_batch([build_knapsack_engine, build_knapsack_engine], solve_kwargs=dict(verbose=0))
+    for objective_value, df_kpis in results:
+        assert objective_value == pytest.approx(5.0)
+        assert df_kpis.VALUE.tolist() == pytest.approx([5.0])
+
+
+class _CountingEngine(OptimizationEngine):
+    """Counts the calls of get_number_of_variables. Solves without a CPLEX runtime."""
+    def __init__(self):
+        super().__init__()
+        self.mdl.solve = lambda **kwargs: object()
+        self.mdl.report = lambda: None
+        self.num_calls = 0
+
+    def get_number_of_variables(self) -> int:
+        self.num_calls += 1
+        return OptimizationEngine.print_solution_max_vars
+
+
+def test_solve_counts_variables_only_for_verbose_2():
+    engine = _CountingEngine()
+    engine.solve(verbose=0)
+    assert engine.num_calls == 0
+    engine.solve(verbose=2)
+    assert engine.num_calls == 1
+
+
+class _Kpi:
+    def __init__(self, name: str, value: float):
+        self.name = name
+        self.value = value
+        self.num_computes = 0
+
+    def compute(self):
+        self.num_computes += 1
+        return self.value
+
+
+def test_get_kpi_output_table_cache():
+    engine = OptimizationEngine()
+    kpis = [_Kpi('cost', 1.0), _Kpi('revenue', 2.0)]
+    engine.mdl = SimpleNamespace(iter_kpis=lambda: iter(kpis), solution=object())
+    df1 = engine.get_kpi_output_table()
+    df1.loc[0, 'VALUE'] = 100
+    df2 = engine.get_kpi_output_table()
+    assert list(df2.VALUE) == [1.0, 2.0]
+    assert [kp.num_computes for kp in kpis] == [1, 1]
+    # Replace a KPI by another one, keeping the number of KPIs
+    kpis[1] = _Kpi('profit', 3.0)
+    df3 = engine.get_kpi_output_table()
+    assert list(df3.NAME) == ['cost', 'profit']
+    assert list(df3.VALUE) == [1.0, 3.0]
+    # New solution
+    engine.mdl.solution = object()
+    engine.get_kpi_output_table()
+    assert kpis[0].num_computes == 3
+
+
+def test_slots():
+    """Instances have no __dict__, but do allow weak references. Subclasses can still add attributes."""
+    engine = OptimizationEngine()
+    assert not hasattr(engine, '__dict__')
+    assert weakref.ref(engine)() is engine
+
+    class MyEngine(OptimizationEngine):
+        def __init__(self):
+            super().__init__()
+            self.my_attribute = 1
+
+    assert MyEngine().my_attribute == 1
@@ -0,0 +1,45 @@
+import weakref
+
+import pandas as pd
+
+from dse_do_utils.plotlymanager import PlotlyManager
+
+
+def test_multi_scenario_compare_after_in_place_update():
+    pm = PlotlyManager(None)
+    assert not pm.get_multi_scenario_compare_selected()
+    pm.ms_inputs = {}
+    pm.ms_outputs = {}
+    assert not pm.get_multi_scenario_compare_selected()
+    pm.ms_inputs['Scenario'] = pd.DataFrame({'scenario_seq': [1, 2], 'scenario_name': ['s1', 's2']})
+    pm.ms_outputs['kpis'] = pd.DataFrame({'scenario_seq': [1, 2], 'NAME': ['cost', 'cost'], 'VALUE': [1.0, 2.0]})
+    assert pm.get_multi_scenario_compare_selected()
+    assert list(pm.get_multi_scenario_table('kpis').scenario_name) == ['s1', 's2']
+    pm.ms_inputs['Scenario'] = pd.DataFrame({'scenario_seq': [1, 2], 'scenario_name': ['a', 'b']})
+    assert list(pm.get_multi_scenario_table('kpis').scenario_name) == ['a', 'b']
+
+
+def test_merge_scenario_name():
+    df = pd.DataFrame({'scenario_seq': [2, 1, 3, 1], 'value': [1, 2, 3, 4]})
+    for scenario_df in [pd.DataFrame({'scenario_seq': [1, 2], 'scenario_name': ['s1', 's2']}),
+                        pd.DataFrame({'scenario_seq': [1, 2, 2], 'scenario_name': ['s1', 's2', 's2b']}),  # Duplicate key
+                        pd.DataFrame({'scenario_seq': [1, 2], 'scenario_name': ['s1', 's2'], 'other': [0, 0]})]:
+        expected = df.merge(scenario_df, on='scenario_seq')
+        actual = PlotlyManager._merge_scenario_name(df, scenario_df)
+        sort_columns = ['scenario_seq', 'value', 'scenario_name']
+        pd.testing.assert_frame_equal(actual.sort_values(sort_columns).reset_index(drop=True),
+                                      expected.sort_values(sort_columns).reset_index(drop=True))
+
+
+def test_slots():
+    """Instances have no __dict__, but do allow weak references. Subclasses can still add attributes."""
+    pm = PlotlyManager(None)
+    assert not hasattr(pm, '__dict__')
+    assert weakref.ref(pm)() is pm
+
+    class MyPlotlyManager(PlotlyManager):
+        def __init__(self, dm):
+            super().__init__(dm)
+            self.my_attribute = 1
+
+    assert MyPlotlyManager(None).my_attribute == 1
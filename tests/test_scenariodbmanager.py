@@ -0,0 +1,140 @@
+import pandas as pd
+import pytest
+import sqlalchemy
+from sqlalchemy import Column, String, Integer
+
+from dse_do_utils.scenariodbmanager import ScenarioDbManager, ScenarioSeqTable, ScenarioDbTable
+
+
+class ItemTable(ScenarioDbTable):
+    def __init__(self):
+        columns_metadata = [
+            Column('item_id', Integer(), primary_key=True),
+            Column('name', String(50)),
+        ]
+        super().__init__('item', columns_metadata)
+
+
+def create_scenario_db_manager(**kwargs) -> ScenarioDbManager:
+    """In-memory SQLite DB with an empty schema."""
+    dbm = ScenarioDbManager(input_db_tables={'Scenario': ScenarioSeqTable(), 'Item': ItemTable()},
+                            output_db_tables={}, **kwargs)
+    dbm.create_schema()
+    return dbm
+
+
+def count_rows(connection, table_name: str) -> int:
+    return connection.execute(sqlalchemy.text(f"SELECT COUNT(*) FROM {table_name}")).scalar()
+
+
+def test_insert_by_row_rolled_back_with_outer_transaction():
+    """A rollback of the enclosing transaction must remove all inserted rows."""
+    for bulk in [True, False]:
+        dbm = create_scenario_db_manager()
+        inputs = {
+            'Scenario': pd.DataFrame({'scenario_seq': [1], 'scenario_name': ['s1']}),
+            'Item': pd.DataFrame({'scenario_seq': 1, 'item_id': [1, 2, 3], 'name': ['a', 'b', 'c']}),
+        }
+        with pytest.raises(RuntimeError):
+            with dbm.engine.begin() as connection:
+                dbm.insert_tables_in_db(inputs, bulk=bulk, connection=connection)
+                assert count_rows(connection, 'item') == 3
+                raise RuntimeError("Force rollback")
+        with dbm.engine.connect() as connection:
+            assert count_rows(connection, 'item') == 0
+            assert count_rows(connection, 'scenario') == 0
+
+
+def test_insert_by_row_reports_and_skips_failed_rows(capsys):
+    dbm = create_scenario_db_manager()
+    inputs = {
+        'Scenario': pd.DataFrame({'scenario_seq': [1], 'scenario_name': ['s1']}),
+        'Item': pd.DataFrame({'scenario_seq': 1, 'item_id': [1, 2, 2, 3], 'name': ['a', 'b', 'c', 'd']}),
+    }
+    with dbm.engine.begin() as connection:
+        num_exceptions = dbm.insert_tables_in_db(inputs, bulk=False, connection=connection)
+    assert num_exceptions == 1
+    assert "UNIQUE constraint failed" in capsys.readouterr().out
+    with dbm.engine.connect() as connection:
+        assert count_rows(connection, 'item') == 3
+
+
+def test_engine_kwargs_with_poolclass():
+    """The default pool settings are not added for a custom poolclass, e.g. NullPool doesn't accept pool_use_lifo."""
+    dbm = create_scenario_db_manager(engine_kwargs={'poolclass': sqlalchemy.pool.NullPool})
+    kwargs = dbm._get_engine_kwargs()
+    assert kwargs == {'poolclass': sqlalchemy.pool.NullPool}
+    sqlalchemy.create_engine('sqlite://', **kwargs)
+    dbm = create_scenario_db_manager(engine_kwargs={'pool_recycle': 600})
+    assert dbm._get_engine_kwargs() == dict(pool_pre_ping=True, pool_use_lifo=True, pool_recycle=600)
+
+
+def create_items(n: int, name: str = 'a') -> pd.DataFrame:
+    return pd.DataFrame({'item_id': range(n), 'name': [f"{name}{i}" for i in range(n)]})
+
+
+def test_read_multi_threaded():
+    # Share the in-memory DB between the threads
+    dbm = create_scenario_db_manager(
+        engine_kwargs=dict(poolclass=sqlalchemy.pool.StaticPool, connect_args={'check_same_thread': False}))
+    dbm.replace_scenario_in_db('s1', inputs={'Item': create_items(5)}, outputs={})
+    dbm.replace_scenario_in_db('s2', inputs={'Item': create_items(3, 'b')}, outputs={})
+    inputs, outputs = dbm.read_scenario_from_db('s1', multi_threaded=True)
+    pd.testing.assert_frame_equal(inputs['Item'], create_items(5))
+    expected_inputs, expected_outputs = dbm.read_multi_scenario_tables_from_db(['s1', 's2'], input_table_names=['*'])
+    inputs, outputs = dbm.read_multi_scenario_tables_from_db(['s1', 's2'], input_table_names=['*'], multi_threaded=True)
+    assert list(inputs.keys()) == list(expected_inputs.keys())
+    for table_name, df in expected_inputs.items():
+        pd.testing.assert_frame_equal(inputs[table_name], df)
+    assert len(inputs['Item']) == 8
+
+
+def test_insert_bulk_integrity_error_message(capsys):
+    """The IntegrityError of the bulk insert reports the SQL and parameters."""
+    for echo in [False, True]:
+        dbm = create_scenario_db_manager(echo=echo)
+        inputs = {
+            'Scenario': pd.DataFrame({'scenario_seq': [1], 'scenario_name': ['s1']}),
+            'Item': pd.DataFrame({'scenario_seq': 1, 'item_id': [1, 2, 2], 'name': ['a', 'b', 'c']}),
+        }
+        with dbm.engine.begin() as connection:
+            dbm.insert_tables_in_db(inputs, bulk=True, connection=connection)
+        out = capsys.readouterr().out
+        assert "Integrity Error" in out
+        assert "[SQL: INSERT INTO item" in out
+        assert "[parameters: " in out
+
+
+def test_replace_scenarios_in_db():
+    dbm = create_scenario_db_manager()
+    dbm.replace_scenarios_in_db({'s1': ({'Item': create_items(3)}, {}), 's2': ({'Item': create_items(2)}, {})})
+    dbm.replace_scenarios_in_db({'s1': ({'Item': create_items(1, 'b')}, {})})
+    inputs, outputs = dbm.read_scenario_from_db('s1')
+    pd.testing.assert_frame_equal(inputs['Item'], create_items(1, 'b'))
+    inputs, outputs = dbm.read_scenario_from_db('s2')
+    pd.testing.assert_frame_equal(inputs['Item'], create_items(2))
+
+
+def test_replace_scenarios_in_db_is_atomic():
+    """If one scenario fails, none of the scenarios is replaced."""
+    dbm = create_scenario_db_manager()
+    dbm.replace_scenarios_in_db({'s1': ({'Item': create_items(3)}, {})})
+    duplicate_items = pd.concat([create_items(2), create_items(1)], ignore_index=True)
+    with pytest.raises(RuntimeError):
+        dbm.replace_scenarios_in_db({'s1': ({'Item': create_items(1, 'b')}, {}), 's2': ({'Item': duplicate_items}, {})},
+                                    bulk=False)
+    inputs, outputs = dbm.read_scenario_from_db('s1')
+    pd.testing.assert_frame_equal(inputs['Item'], create_items(3))
+    with dbm.engine.connect() as connection:
+        assert count_rows(connection, 'scenario') == 1
+
+
+def test_read_chunksize():
+    for read_chunksize in [None, 2, 5, 1000]:
+        dbm = create_scenario_db_manager(read_chunksize=read_chunksize)
+        dbm.replace_scenario_in_db('s1', inputs={'Item': create_items(5)}, outputs={})
+        inputs, outputs = dbm.read_scenario_from_db('s1')
+        pd.testing.assert_frame_equal(inputs['Item'], create_items(5))
+        inputs, outputs = dbm.read_scenario_from_db('s2')  # No rows, but still the columns
+        assert inputs['Item'].shape == (0, 2)
+        assert list(inputs['Item'].columns) == ['item_id', 'name']